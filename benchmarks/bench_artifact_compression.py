@@ -0,0 +1,65 @@
+"""Report bytes stored in S3 and transferred by the API per synthetic meeting, with and without compression.
+
+Run from the repository root:
+
+    python benchmarks/bench_artifact_compression.py
+"""
+import gzip
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda', 'common_layer', 'python'))
+
+import artifact_store
+from synthetic_meeting import synthetic_transcript, speaker_turns
+
+MEETING_MINUTES = (15, 60, 120)
+MEETINGS_PER_USER = 20
+
+
+def artifacts_for(contents):
+    transcript = contents['results']['transcripts'][0]['transcript']
+    compiled = ["Original Transcript", "", transcript, "", "", "", "Full Transcript - Grouped by Speaker", ""]
+    compiled += ["{} - {}".format(speaker, text) for speaker, text in speaker_turns(contents)]
+    notes = {'output_text': ' '.join(transcript.split()[:200])}
+    #transcripts are written by Transcribe and stored as they are, so only the artifacts this repo writes are measured
+    return {
+        'compiled': '\n'.join(compiled).encode('utf-8'),
+        'notes': json.dumps(notes).encode('utf-8'),
+    }
+
+
+def encodings():
+    available = ['identity', 'gzip']
+    if artifact_store.zstandard is not None:
+        available.append('zstd')
+    return available
+
+
+def main():
+    print("Stored bytes per meeting")
+    print("{:>8} {:>11} {:>12} {:>12} {:>7}".format('minutes', 'artifact', 'encoding', 'bytes', 'ratio'))
+    for minutes in MEETING_MINUTES:
+        artifacts = artifacts_for(synthetic_transcript(minutes=minutes, seed=minutes))
+        for name, body in artifacts.items():
+            for encoding in encodings():
+                compressed, _ = artifact_store.compress(body, encoding)
+                print("{:>8} {:>11} {:>12} {:>12} {:>7.1f}".format(
+                    minutes, name, encoding, len(compressed), len(body) / len(compressed)))
+
+    print()
+    print("list_uploads response bytes transferred ({} meetings, API Gateway gzip)".format(MEETINGS_PER_USER))
+    print("{:>8} {:>12} {:>12} {:>7}".format('minutes', 'plain', 'gzip', 'ratio'))
+    for minutes in MEETING_MINUTES:
+        #a different meeting per item - identical items would let gzip compress each against the previous one
+        items = [{'file_name': str(i), 'file_timestamp': str(i),
+                  'combined_summary': artifacts_for(synthetic_transcript(minutes=minutes, seed=minutes * 1000 + i))['compiled'].decode('utf-8')}
+                 for i in range(MEETINGS_PER_USER)]
+        plain = json.dumps(items).encode('utf-8')
+        compressed = gzip.compress(plain)
+        print("{:>8} {:>12} {:>12} {:>7.1f}".format(minutes, len(plain), len(compressed), len(plain) / len(compressed)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Runtime and peak memory of the extractive draft summary on synthetic meetings.
+
+Run from the repository root:
+
+    python benchmarks/bench_extractive_summary.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda', 'generate_compiled'))
+
+import extractive_summary
+from synthetic_meeting import synthetic_transcript, speaker_turns
+
+MEETING_MINUTES = (15, 60, 120, 240)
+REPEATS = 3
+
+
+def main():
+    print("{:>8} {:>10} {:>10} {:>12} {:>14}".format('minutes', 'turns', 'sentences', 'best ms', 'peak memory MB'))
+    for minutes in MEETING_MINUTES:
+        turns = speaker_turns(synthetic_transcript(minutes=minutes, seed=minutes))
+        sentences = len(extractive_summary.split_sentences(turns))
+
+        timings = []
+        for _ in range(REPEATS):
+            started = time.perf_counter()
+            extractive_summary.summarise(turns)
+            timings.append(time.perf_counter() - started)
+
+        #numpy reports its allocations to tracemalloc, so this includes the matrices
+        tracemalloc.start()
+        extractive_summary.summarise(turns)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print("{:>8} {:>10} {:>10} {:>12.1f} {:>14.1f}".format(
+            minutes, len(turns), sentences, min(timings) * 1000, peak / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Deterministic synthetic meetings in the Amazon Transcribe output format, for benchmarks."""
+import random
+
+VOCABULARY = (
+    "we need to agree the budget for the next quarter and make sure the release goes out on time "
+    "customers have asked about the new dashboard and the reporting features so the team should "
+    "prioritise the migration work before the end of the month I think the risk is mostly around "
+    "testing and the integration with the billing system which still has a few open issues "
+    "marketing wants a launch date and a short summary of what is changing for existing users "
+    "let us follow up with legal about the data retention policy and schedule another review"
+).split()
+
+WORDS_PER_MINUTE = 150
+
+
+def synthetic_transcript(minutes=60, speakers=4, seed=0, language_code='en-US'):
+    """Build a Transcribe-style result dict for a meeting of the given length."""
+    rng = random.Random(seed)
+    items = []
+    words = []
+    speaker = 0
+    for _ in range(minutes * WORDS_PER_MINUTE):
+        #change speaker roughly every 40 words
+        if rng.random() < 0.025:
+            speaker = rng.randrange(speakers)
+        word = rng.choice(VOCABULARY)
+        items.append({
+            'type': 'pronunciation',
+            'speaker_label': 'spk_{}'.format(speaker),
+            'alternatives': [{'confidence': '0.99', 'content': word}],
+        })
+        words.append(word)
+        #end a sentence roughly every 15 words
+        if rng.random() < 0.07:
+            items.append({
+                'type': 'punctuation',
+                'speaker_label': 'spk_{}'.format(speaker),
+                'alternatives': [{'confidence': '0.0', 'content': '.'}],
+            })
+            words[-1] = words[-1] + '.'
+
+    return {
+        'jobName': 'synthetic_{}'.format(seed),
+        'results': {
+            'language_code': language_code,
+            'transcripts': [{'transcript': ' '.join(words)}],
+            'items': items,
+        },
+    }
+
+
+def speaker_turns(contents):
+    """Group the transcript items into (speaker, text) turns, as generate_compiled does."""
+    turns = []
+    for part in contents['results']['items']:
+        content = part['alternatives'][0]['content']
+        if turns and turns[-1][0] == part['speaker_label']:
+            turns[-1][1].append(content)
+        else:
+            turns.append((part['speaker_label'], [content]))
+    return [(speaker, ' '.join(words)) for speaker, words in turns]
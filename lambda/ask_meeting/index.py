@@ -0,0 +1,116 @@
+import json
+import boto3
+import mmap
+import os
+
+from botocore.exceptions import ClientError
+
+import meeting_index
+import structured_logger
+
+DYNAMO_TABLE = os.environ.get('DYNAMODB_TABLE_NAME')
+S3_BUCKET = os.environ.get('APPLICATION_BUCKET')
+EMBEDDINGS_PREFIX = os.environ.get('EMBEDDINGS_PREFIX')
+BEDROCK_MODEL_ID = os.environ.get('BEDROCK_MODEL_ID')
+TOP_K = int(os.environ.get('ASK_TOP_K', '4'))
+MAX_QUESTION_CHARS = 1000
+#one scratch file reused by every invocation, so a warm container doesn't fill /tmp
+INDEX_PATH = '/tmp/meeting.idx'
+
+s3_client = boto3.client('s3')
+dynamodb_client = boto3.client('dynamodb')
+bedrock_runtime = boto3.client(service_name="bedrock-runtime")
+
+logger = structured_logger.get_logger('ask_meeting')
+
+PROMPT_TEMPLATE = """Here are extracts from a meeting transcript:
+
+{context}
+
+Using only these extracts, answer the following question in English. If the extracts don't contain the answer, say so.
+
+Question: {question}"""
+
+
+def response(status, body):
+    return {
+        'statusCode': status,
+        'body': json.dumps(body),
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        }
+    }
+
+
+def load_index(file_name):
+    #memory map the index from /tmp so the embedding matrix is never copied into the heap
+    s3_client.download_file(Bucket=S3_BUCKET, Key='{}/{}.idx'.format(EMBEDDINGS_PREFIX, file_name), Filename=INDEX_PATH)
+    try:
+        with open(INDEX_PATH, 'rb') as f:
+            index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        #the mapping keeps the data readable once the file is removed
+        os.remove(INDEX_PATH)
+    return meeting_index.MeetingIndex(index_map)
+
+
+def answer_question(index, question, embedder, k=TOP_K):
+    """Find the chunks closest to the question and ask the model to answer from those alone."""
+    query_vector = embedder.embed([question])[0]
+    matches = index.search(query_vector, k=k)
+    context = '\n\n'.join('[{}] {}'.format(rank, index.chunk(chunk_index)) for rank, (chunk_index, _) in enumerate(matches, start=1))
+
+    model_response = bedrock_runtime.invoke_model(
+        modelId=BEDROCK_MODEL_ID,
+        contentType='application/json',
+        accept='application/json',
+        body=json.dumps({
+            'anthropic_version': 'bedrock-2023-05-31',
+            'max_tokens': 512,
+            'temperature': 0,
+            'messages': [{'role': 'user', 'content': PROMPT_TEMPLATE.format(context=context, question=question)}]
+        })
+    )
+    answer = json.loads(model_response['body'].read())['content'][0]['text']
+    return answer, matches
+
+
+def lambda_handler(event, context):
+    logger.start_invocation(event, context)
+
+    try:
+        request = json.loads(event.get('body') or '{}')
+    except ValueError:
+        return response(400, "Request body must be JSON")
+    file_name = request.get('file')
+    question = (request.get('question') or '').strip()
+    if not file_name or not question:
+        return response(400, "file and question are required")
+    if len(question) > MAX_QUESTION_CHARS:
+        return response(400, "Question is too long")
+
+    dynamodb_key = event['requestContext']['authorizer']['claims']['email']
+    dynamodb_response = dynamodb_client.get_item(TableName=DYNAMO_TABLE, Key={'file_name':{'S':str(file_name)}})
+
+    #only the owner of a meeting can ask about it
+    if 'Item' not in dynamodb_response or dynamodb_response['Item']['file_owner']['S'] != dynamodb_key:
+        logger.info('no item found in dynamodb', file_name=file_name)
+        return response(404, "No item found in dynamodb")
+
+    try:
+        index = load_index(file_name)
+    except ClientError as e:
+        logger.exception('error loading embedding index', e, file_name=file_name)
+        return response(404, "Meeting is not ready for questions yet")
+
+    try:
+        embedder = meeting_index.create_embedder(index.header, bedrock_runtime)
+        answer, matches = answer_question(index, question, embedder)
+        logger.info('answered question', file_name=file_name, chunks=len(index.offsets),
+                    scores=[round(score, 3) for _, score in matches])
+        sources = [{'chunk': chunk_index, 'score': round(score, 4), 'text': index.chunk(chunk_index)} for chunk_index, score in matches]
+    finally:
+        index.close()
+
+    return response(200, {'answer': answer, 'sources': sources})
@@ -0,0 +1,115 @@
+import gzip
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import structured_logger
+
+logger = structured_logger.get_logger('artifact_store')
+
+#encoding used for new artifacts - gzip (default), zstd (if zstandard is installed) or identity
+ARTIFACT_ENCODING = os.environ.get('ARTIFACT_ENCODING', 'gzip')
+#resolve the fallback once, rather than on every put_artifact call
+if ARTIFACT_ENCODING == 'zstd' and zstandard is None:
+    logger.warning('zstandard not installed - falling back to gzip')
+    ARTIFACT_ENCODING = 'gzip'
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def resolve_encoding(encoding=None):
+    """Return the encoding that will actually be used, falling back to gzip if zstd is unavailable."""
+    encoding = encoding or ARTIFACT_ENCODING
+    if encoding == 'zstd' and zstandard is None:
+        return 'gzip'
+    if encoding not in ('gzip', 'zstd', 'identity'):
+        raise ValueError("Unsupported artifact encoding: {}".format(encoding))
+    return encoding
+
+
+def compress(body, encoding=None):
+    """Compress bytes, returning (compressed_body, content_encoding)."""
+    encoding = resolve_encoding(encoding)
+    if encoding == 'gzip':
+        #mtime=0 keeps the output deterministic for the same input
+        return gzip.compress(body, compresslevel=6, mtime=0), 'gzip'
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=6).compress(body), 'zstd'
+    return body, 'identity'
+
+
+def decompress(body, content_encoding=None):
+    """Decompress bytes using the Content-Encoding, or the magic bytes if it isn't set."""
+    if content_encoding in (None, '', 'identity'):
+        if body[:2] == GZIP_MAGIC:
+            content_encoding = 'gzip'
+        elif body[:4] == ZSTD_MAGIC:
+            content_encoding = 'zstd'
+        else:
+            return body
+
+    if content_encoding == 'gzip':
+        return gzip.decompress(body)
+    if content_encoding == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd artifacts")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    raise ValueError("Unsupported content encoding: {}".format(content_encoding))
+
+
+class _Identity:
+    unconsumed_tail = b''
+
+    def decompress(self, data, max_length=0):
+        return data
+
+
+class _Zstd:
+    unconsumed_tail = b''
+
+    def __init__(self):
+        self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data, max_length=0):
+        return self._decompressor.decompress(data)
+
+
+def decompressor(content_encoding=None):
+    """Incremental decompressor for streaming reads, with a zlib style decompress(data, max_length)."""
+    if content_encoding in (None, '', 'identity'):
+        return _Identity()
+    if content_encoding == 'gzip':
+        return zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    if content_encoding == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd artifacts")
+        return _Zstd()
+    raise ValueError("Unsupported content encoding: {}".format(content_encoding))
+
+
+def put_artifact(s3_client, bucket, key, body, content_type='text/plain; charset=utf-8', encoding=None):
+    """Compress and store an artifact in S3. Returns the number of bytes stored."""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    compressed, content_encoding = compress(body, encoding)
+
+    put_args = {'Bucket': bucket, 'Key': key, 'Body': compressed, 'ContentType': content_type}
+    if content_encoding != 'identity':
+        put_args['ContentEncoding'] = content_encoding
+    s3_client.put_object(**put_args)
+    return len(compressed)
+
+
+def get_artifact(s3_client, bucket, key):
+    """Read an artifact from S3, transparently decompressing it. Returns bytes."""
+    response = s3_client.get_object(Bucket=bucket, Key=key)
+    return decompress(response['Body'].read(), response.get('ContentEncoding'))
+
+
+def get_artifact_text(s3_client, bucket, key):
+    return get_artifact(s3_client, bucket, key).decode('utf-8')
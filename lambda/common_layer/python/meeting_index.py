@@ -0,0 +1,173 @@
+import concurrent.futures
+import hashlib
+import json
+import re
+import struct
+
+import numpy as np
+
+#index layout: magic, version, header length, JSON header, padding, float32 matrix, transcript text
+INDEX_MAGIC = b'MNIX'
+INDEX_VERSION = 1
+INDEX_ALIGNMENT = 64
+PREAMBLE = struct.Struct('<4sHxxI')
+
+DEFAULT_DIMENSIONS = 256
+TOKEN_PATTERN = re.compile(r"[\w']+")
+
+
+class HashingEmbedder:
+    """Deterministic local embedder - hashed bag of words and word pairs. No network calls."""
+
+    name = 'hashing'
+
+    def __init__(self, dimensions=DEFAULT_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def _bucket(self, token):
+        digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+        value = int.from_bytes(digest, 'little')
+        return value % self.dimensions, 1.0 if (value >> 63) & 1 else -1.0
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = TOKEN_PATTERN.findall(text.lower())
+            for token in tokens + [a + ' ' + b for a, b in zip(tokens, tokens[1:])]:
+                bucket, sign = self._bucket(token)
+                matrix[row, bucket] += sign
+        return matrix
+
+    def config(self):
+        return {'embedder': self.name, 'dimensions': self.dimensions}
+
+
+class BedrockEmbedder:
+    """Amazon Titan text embeddings through Bedrock, one request per text run concurrently."""
+
+    name = 'bedrock'
+
+    def __init__(self, bedrock_runtime, model_id='amazon.titan-embed-text-v2:0', dimensions=DEFAULT_DIMENSIONS, max_workers=8):
+        self.bedrock_runtime = bedrock_runtime
+        self.model_id = model_id
+        self.dimensions = dimensions
+        self.max_workers = max_workers
+
+    def _embed_one(self, text):
+        response = self.bedrock_runtime.invoke_model(
+            modelId=self.model_id,
+            contentType='application/json',
+            accept='application/json',
+            body=json.dumps({'inputText': text, 'dimensions': self.dimensions, 'normalize': True})
+        )
+        return json.loads(response['body'].read())['embedding']
+
+    def embed(self, texts):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            embeddings = list(executor.map(self._embed_one, texts))
+        return np.asarray(embeddings, dtype=np.float32).reshape(len(texts), self.dimensions)
+
+    def config(self):
+        return {'embedder': self.name, 'model_id': self.model_id, 'dimensions': self.dimensions}
+
+
+def create_embedder(config, bedrock_runtime=None):
+    """Build an embedder from its config, e.g. the one stored in an index header."""
+    if config['embedder'] == HashingEmbedder.name:
+        return HashingEmbedder(dimensions=config['dimensions'])
+    if config['embedder'] == BedrockEmbedder.name:
+        return BedrockEmbedder(bedrock_runtime, model_id=config['model_id'], dimensions=config['dimensions'])
+    raise ValueError("Unknown embedder: {}".format(config['embedder']))
+
+
+def normalise_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def build_index(embedder, text, chunk_offsets):
+    """Embed the chunks of `text` given as (start, end) character offsets and serialise the index to bytes.
+
+    The transcript text is stored after the matrix, with chunk offsets converted to UTF-8 byte offsets,
+    so a reader can slice out the matching chunks without decoding the whole transcript.
+    """
+    chunks = [text[start:end] for start, end in chunk_offsets]
+    matrix = normalise_rows(embedder.embed(chunks)) if chunks else np.zeros((0, embedder.dimensions), dtype=np.float32)
+
+    byte_offsets = []
+    encoded_prefix_chars = 0
+    encoded_prefix_bytes = 0
+    #offsets are mostly increasing, so convert them by encoding only the text between consecutive offsets
+    for start, end in chunk_offsets:
+        start_bytes = _byte_offset(text, start, encoded_prefix_chars, encoded_prefix_bytes)
+        end_bytes = start_bytes + len(text[start:end].encode('utf-8'))
+        encoded_prefix_chars, encoded_prefix_bytes = start, start_bytes
+        byte_offsets.append([start_bytes, end_bytes])
+
+    header = dict(embedder.config())
+    header.update({'version': INDEX_VERSION, 'count': len(chunks), 'offsets': byte_offsets})
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+
+    matrix_offset = _align(PREAMBLE.size + len(header_bytes))
+    padding = b'\0' * (matrix_offset - PREAMBLE.size - len(header_bytes))
+    return b''.join([
+        PREAMBLE.pack(INDEX_MAGIC, INDEX_VERSION, len(header_bytes)),
+        header_bytes,
+        padding,
+        np.ascontiguousarray(matrix, dtype='<f4').tobytes(),
+        text.encode('utf-8'),
+    ])
+
+
+def _byte_offset(text, char_offset, known_chars, known_bytes):
+    if char_offset >= known_chars:
+        return known_bytes + len(text[known_chars:char_offset].encode('utf-8'))
+    return len(text[:char_offset].encode('utf-8'))
+
+
+def _align(size):
+    return (size + INDEX_ALIGNMENT - 1) // INDEX_ALIGNMENT * INDEX_ALIGNMENT
+
+
+class MeetingIndex:
+    """Read only view over a serialised index. `buffer` can be bytes or an mmap - nothing is copied."""
+
+    def __init__(self, buffer):
+        magic, version, header_length = PREAMBLE.unpack_from(buffer, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError("Not a meeting index (version {})".format(version))
+        self.header = json.loads(bytes(buffer[PREAMBLE.size:PREAMBLE.size + header_length]))
+        self.offsets = self.header['offsets']
+
+        matrix_offset = _align(PREAMBLE.size + header_length)
+        count, dimensions = self.header['count'], self.header['dimensions']
+        self.matrix = np.frombuffer(buffer, dtype='<f4', count=count * dimensions, offset=matrix_offset).reshape(count, dimensions)
+        self.text = memoryview(buffer)[matrix_offset + self.matrix.nbytes:]
+        self.buffer = buffer
+
+    def close(self):
+        """Release the views onto the buffer, and close it if it is an mmap."""
+        #an mmap can't be closed while numpy or a memoryview still exports it
+        self.matrix = None
+        self.text.release()
+        if hasattr(self.buffer, 'close'):
+            self.buffer.close()
+
+    def chunk(self, index):
+        start, end = self.offsets[index]
+        return bytes(self.text[start:end]).decode('utf-8', errors='ignore')
+
+    def search(self, query_vector, k=4):
+        """Top k chunks by cosine similarity. Returns a list of (chunk_index, score), best first."""
+        if len(self.offsets) == 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        scores = self.matrix @ query
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(index), float(scores[index])) for index in top]
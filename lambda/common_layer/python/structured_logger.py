@@ -0,0 +1,156 @@
+import json
+import os
+import random
+import sys
+import time
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+#defaults can be overridden per function with environment variables
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '0.01'))
+LOG_MAX_FIELD_CHARS = int(os.environ.get('LOG_MAX_FIELD_CHARS', '256'))
+LOG_MAX_ITEMS = 20
+LOG_MAX_DEPTH = 4
+
+#keys whose values are never written to the logs (matched case insensitively)
+REDACTED_KEYS = {
+    'authorization', 'claims', 'email', 'file_owner', 'owner', 'cognito:username',
+    'pre_signed_url', 'x-amz-security-token',
+}
+REDACTED = '[REDACTED]'
+
+
+def sanitise(value, max_chars=LOG_MAX_FIELD_CHARS, depth=0):
+    """Return a JSON safe copy of value with sensitive keys redacted and large payloads truncated."""
+    if isinstance(value, dict):
+        if depth >= LOG_MAX_DEPTH:
+            return '{{...{} keys}}'.format(len(value))
+        sanitised = {}
+        for count, (key, item) in enumerate(value.items()):
+            if count == LOG_MAX_ITEMS:
+                sanitised['...'] = '+{} keys'.format(len(value) - LOG_MAX_ITEMS)
+                break
+            if str(key).lower() in REDACTED_KEYS:
+                sanitised[str(key)] = REDACTED
+            else:
+                sanitised[str(key)] = sanitise(item, max_chars, depth + 1)
+        return sanitised
+    if isinstance(value, (list, tuple)):
+        if depth >= LOG_MAX_DEPTH:
+            return '[...{} items]'.format(len(value))
+        sanitised = [sanitise(item, max_chars, depth + 1) for item in value[:LOG_MAX_ITEMS]]
+        if len(value) > LOG_MAX_ITEMS:
+            sanitised.append('+{} items'.format(len(value) - LOG_MAX_ITEMS))
+        return sanitised
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = str(value)
+    if len(text) > max_chars:
+        return '{}...(+{} chars)'.format(text[:max_chars], len(text) - max_chars)
+    return text
+
+
+def correlation_id(event, context=None):
+    """Pick an id that ties the log lines of one request together across services."""
+    if isinstance(event, dict):
+        request_context = event.get('requestContext') or {}
+        if request_context.get('requestId'):
+            return request_context['requestId']
+        records = event.get('Records') or []
+        if records:
+            s3_request_id = (records[0].get('responseElements') or {}).get('x-amz-request-id')
+            if s3_request_id:
+                return s3_request_id
+    if context is not None and getattr(context, 'aws_request_id', None):
+        return context.aws_request_id
+    return None
+
+
+def describe_event(event):
+    """Small, non sensitive description of an S3 notification or API Gateway event."""
+    if not isinstance(event, dict):
+        return {}
+    if event.get('Records'):
+        record = event['Records'][0]
+        s3 = record.get('s3', {})
+        return {
+            'source': record.get('eventSource'),
+            'bucket': s3.get('bucket', {}).get('name'),
+            'key': s3.get('object', {}).get('key'),
+            'size': s3.get('object', {}).get('size'),
+        }
+    if event.get('httpMethod'):
+        return {
+            'source': 'apigateway',
+            'method': event.get('httpMethod'),
+            'path': event.get('path'),
+            'query': sorted((event.get('queryStringParameters') or {}).keys()),
+        }
+    return {'keys': sorted(event.keys())[:LOG_MAX_ITEMS]}
+
+
+class StructuredLogger:
+    """Writes one JSON object per line, with a correlation id and level filtering.
+
+    Debug output is sampled per invocation so a small fraction of requests carry full detail.
+    """
+
+    def __init__(self, service, level=LOG_LEVEL, debug_sample_rate=LOG_DEBUG_SAMPLE_RATE, stream=None):
+        self.service = service
+        self.level = LEVELS.get(level.upper(), LEVELS['INFO'])
+        self.configured_level = self.level
+        self.debug_sample_rate = debug_sample_rate
+        self.stream = stream
+        self.correlation_id = None
+
+    def start_invocation(self, event, context=None):
+        """Reset per invocation state and log a summary of the event (the full event only at debug)."""
+        self.correlation_id = correlation_id(event, context)
+        self.level = self.configured_level
+        if random.random() < self.debug_sample_rate:
+            self.level = LEVELS['DEBUG']
+        self.info('invocation start', event=describe_event(event))
+        self.debug('event', event=event)
+
+    def enabled(self, level):
+        return LEVELS[level] >= self.level
+
+    def log(self, level, message, **fields):
+        if not self.enabled(level):
+            return
+        record = {
+            'timestamp': round(time.time(), 3),
+            'level': level,
+            'service': self.service,
+            'correlation_id': self.correlation_id,
+            'message': message,
+        }
+        record.update(sanitise(fields))
+        stream = self.stream or sys.stdout
+        stream.write(json.dumps(record, default=str) + '\n')
+
+    def debug(self, message, **fields):
+        self.log('DEBUG', message, **fields)
+
+    def info(self, message, **fields):
+        self.log('INFO', message, **fields)
+
+    def warning(self, message, **fields):
+        self.log('WARNING', message, **fields)
+
+    def error(self, message, **fields):
+        self.log('ERROR', message, **fields)
+
+    def exception(self, message, error, **fields):
+        self.log('ERROR', message, error=repr(error), error_type=type(error).__name__, **fields)
+
+
+_loggers = {}
+
+
+def get_logger(service):
+    """Return the shared logger for a service, so helper modules log with the handler's correlation id."""
+    if service not in _loggers:
+        _loggers[service] = StructuredLogger(service)
+    return _loggers[service]
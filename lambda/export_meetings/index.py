@@ -0,0 +1,153 @@
+import json
+import boto3
+import concurrent.futures
+import datetime
+import hashlib
+import os
+import re
+import uuid
+from boto3.dynamodb.conditions import Attr
+from botocore.client import Config
+from botocore.exceptions import ClientError
+
+import structured_logger
+import zip_export
+
+DYNAMO_TABLE = os.environ.get('DYNAMODB_TABLE_NAME')
+S3_BUCKET = os.environ.get('APPLICATION_BUCKET')
+NOTES_PREFIX = os.environ.get('NOTES_PREFIX')
+COMPILED_PREFIX = os.environ.get('COMPILED_PREFIX')
+TRANSLATIONS_PREFIX = os.environ.get('TRANSLATIONS_PREFIX')
+EXPORTS_PREFIX = os.environ.get('EXPORTS_PREFIX')
+EXPORT_WORKER_FUNCTION = os.environ.get('EXPORT_WORKER_FUNCTION')
+EXPORT_PART_SIZE = int(os.environ.get('EXPORT_PART_SIZE', str(zip_export.DEFAULT_PART_SIZE)))
+DOWNLOAD_URL_EXPIRY_SECONDS = 900
+MAX_HEAD_REQUESTS = 8
+
+#s3v4 signatures are needed for the download link, as for the upload link
+s3_client = boto3.client('s3', config=Config(signature_version='s3v4'))
+lambda_client = boto3.client('lambda')
+dynamodb_resource = boto3.resource('dynamodb')
+table = dynamodb_resource.Table(DYNAMO_TABLE)
+
+logger = structured_logger.get_logger('export_meetings')
+
+
+def response(status, body):
+    return {
+        'statusCode': status,
+        'body': json.dumps(body),
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        }
+    }
+
+
+def export_key(owner, export_id, suffix='zip'):
+    #exports are stored under a hash of the owner, so one user can't guess another's export
+    owner_hash = hashlib.sha256(owner.lower().encode('utf-8')).hexdigest()[:32]
+    return '{}/{}/{}.{}'.format(EXPORTS_PREFIX, owner_hash, export_id, suffix)
+
+
+def owner_items(owner):
+    scan_args = {
+        'FilterExpression': Attr("file_owner").eq(owner),
+        'ProjectionExpression': 'file_name, file_original, file_timestamp',
+    }
+    items = []
+    while True:
+        dynamodb_response = table.scan(**scan_args)
+        items.extend(dynamodb_response.get('Items', []))
+        if 'LastEvaluatedKey' not in dynamodb_response:
+            return sorted(items, key=lambda x: x['file_timestamp'])
+        scan_args['ExclusiveStartKey'] = dynamodb_response['LastEvaluatedKey']
+
+
+def _head(key):
+    try:
+        return s3_client.head_object(Bucket=S3_BUCKET, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+
+
+def archive_members(items):
+    """The compiled file, notes and translation of each meeting that exist, as zip_export members."""
+    candidates = []
+    for item in items:
+        original = os.path.splitext(item.get('file_original', 'meeting'))[0]
+        folder = '{}_{}'.format(re.sub(r'[^\w.-]+', '_', original)[:64], item['file_name'][:8])
+        date_time = datetime.datetime.fromtimestamp(int(item['file_timestamp']), tz=datetime.timezone.utc).timetuple()[:6]
+        for prefix, label in ((COMPILED_PREFIX, 'compiled'), (NOTES_PREFIX, 'notes'), (TRANSLATIONS_PREFIX, 'translation')):
+            candidates.append({
+                'key': '{}/{}.txt'.format(prefix, item['file_name']),
+                'name': '{}/{}.txt'.format(folder, label),
+                'date_time': date_time,
+            })
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_HEAD_REQUESTS) as executor:
+        heads = list(executor.map(_head, [candidate['key'] for candidate in candidates]))
+
+    members = []
+    for candidate, head in zip(candidates, heads):
+        if head is None or head['ContentLength'] == 0:
+            continue
+        candidate['size'] = head['ContentLength']
+        candidate['content_encoding'] = head.get('ContentEncoding')
+        members.append(candidate)
+    return members
+
+
+def export_handler(event, context):
+    """Worker - builds the archive for one export request, invoked asynchronously by lambda_handler."""
+    logger.start_invocation(event, context)
+    owner = event['owner']
+    export_id = event['export_id']
+
+    try:
+        members = archive_members(owner_items(owner))
+        report = zip_export.stream_zip(s3_client, S3_BUCKET, members, export_key(owner, export_id), part_size=EXPORT_PART_SIZE)
+    except Exception as e:
+        logger.exception('error building export', e, export_id=export_id)
+        #leave a marker so the status check can report the failure
+        s3_client.put_object(Bucket=S3_BUCKET, Key=export_key(owner, export_id, 'failed'), Body=b'')
+        raise
+
+    logger.info('export complete', export_id=export_id, **report)
+    return report
+
+
+def lambda_handler(event, context):
+    """POST /export starts an export of all the caller's meetings; GET /export?id= returns its status and link."""
+    logger.start_invocation(event, context)
+    owner = event['requestContext']['authorizer']['claims']['email']
+
+    if event.get('httpMethod') == 'POST':
+        export_id = str(uuid.uuid4())
+        lambda_client.invoke(
+            FunctionName=EXPORT_WORKER_FUNCTION,
+            InvocationType='Event',
+            Payload=json.dumps({'owner': owner, 'export_id': export_id}).encode('utf-8')
+        )
+        logger.info('export started', export_id=export_id)
+        return response(202, {'export_id': export_id, 'status': 'pending'})
+
+    export_id = (event.get('queryStringParameters') or {}).get('id', '')
+    try:
+        export_id = str(uuid.UUID(export_id))
+    except ValueError:
+        return response(400, "A valid export id is required")
+
+    key = export_key(owner, export_id)
+    if _head(key) is None:
+        status = 'failed' if _head(export_key(owner, export_id, 'failed')) is not None else 'pending'
+        return response(200, {'export_id': export_id, 'status': status})
+
+    download_url = s3_client.generate_presigned_url('get_object', Params={
+        'Bucket': S3_BUCKET,
+        'Key': key,
+        'ResponseContentDisposition': 'attachment; filename="meeting-notes.zip"'
+    }, ExpiresIn=DOWNLOAD_URL_EXPIRY_SECONDS)
+    return response(200, {'export_id': export_id, 'status': 'ready', 'download_url': download_url})
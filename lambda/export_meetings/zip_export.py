@@ -0,0 +1,163 @@
+import collections
+import concurrent.futures
+import threading
+import zipfile
+
+import artifact_store
+
+#S3 multipart parts must be at least 5 MiB, apart from the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_RANGE_SIZE = 1024 * 1024
+DEFAULT_MAX_IN_FLIGHT = 4
+#decompressed output per call, so a small highly compressed range can't expand without limit
+MAX_DECOMPRESSED_CHUNK = 1024 * 1024
+ZIP64_MEMBER_BYTES = 1024 * 1024 * 1024
+
+
+class MultipartUploadWriter:
+    """Write only, non seekable file object that uploads fixed size parts to an S3 multipart upload.
+
+    At most one part is held in memory at a time. `peak_buffered` records the largest buffer seen.
+    """
+
+    def __init__(self, s3_client, bucket, key, part_size=DEFAULT_PART_SIZE, content_type='application/zip'):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError("Part size must be at least {} bytes".format(MIN_PART_SIZE))
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.upload_id = s3_client.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)['UploadId']
+        self.parts = []
+        self.buffer = bytearray()
+        self.position = 0
+        self.peak_buffered = 0
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        self.peak_buffered = max(self.peak_buffered, len(self.buffer))
+        while len(self.buffer) >= self.part_size:
+            self._upload_part(bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def _upload_part(self, body):
+        part_number = len(self.parts) + 1
+        response = self.s3_client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                              PartNumber=part_number, Body=body)
+        self.parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+
+    def complete(self):
+        #the last part may be smaller than the minimum part size
+        if self.buffer or not self.parts:
+            self._upload_part(bytes(self.buffer))
+            self.buffer = bytearray()
+        self.s3_client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                                 MultipartUpload={'Parts': self.parts})
+
+    def abort(self):
+        self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+
+class ParallelRangeReader:
+    """Fetch a sequence of S3 objects as fixed size ranged GETs, several ranges in flight, yielding them in order.
+
+    Memory is bounded by max_in_flight * range_size, whatever the number or size of the objects.
+    """
+
+    def __init__(self, s3_client, bucket, range_size=DEFAULT_RANGE_SIZE, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.range_size = range_size
+        self.max_in_flight = max_in_flight
+        self.lock = threading.Lock()
+        self.buffered = 0
+        self.peak_buffered = 0
+
+    def _fetch(self, key, start, end):
+        body = self.s3_client.get_object(Bucket=self.bucket, Key=key, Range='bytes={}-{}'.format(start, end))['Body'].read()
+        with self.lock:
+            self.buffered += len(body)
+            self.peak_buffered = max(self.peak_buffered, self.buffered)
+        return body
+
+    def _ranges(self, objects):
+        for object_index, item in enumerate(objects):
+            for start in range(0, item['size'], self.range_size):
+                yield object_index, item['key'], start, min(start + self.range_size, item['size']) - 1
+
+    def read(self, objects):
+        """Yield (object_index, bytes) for every range of every object, in order."""
+        ranges = self._ranges(objects)
+        pending = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            while True:
+                while len(pending) < self.max_in_flight:
+                    next_range = next(ranges, None)
+                    if next_range is None:
+                        break
+                    object_index, key, start, end = next_range
+                    pending.append((object_index, executor.submit(self._fetch, key, start, end)))
+                if not pending:
+                    return
+                object_index, future = pending.popleft()
+                body = future.result()
+                yield object_index, body
+                with self.lock:
+                    self.buffered -= len(body)
+
+
+def stream_zip(s3_client, bucket, members, export_key, part_size=DEFAULT_PART_SIZE,
+               range_size=DEFAULT_RANGE_SIZE, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+    """Zip S3 objects straight into a multipart upload at export_key.
+
+    members is a list of {'key', 'size', 'name', 'content_encoding', 'date_time'} for non empty objects;
+    stored artifacts are decompressed on the way through so the archive holds plain text.
+    Returns a report including the memory high water marks.
+    """
+    writer = MultipartUploadWriter(s3_client, bucket, export_key, part_size=part_size)
+    reader = ParallelRangeReader(s3_client, bucket, range_size=range_size, max_in_flight=max_in_flight)
+    try:
+        with zipfile.ZipFile(writer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+            current_index = None
+            member_file = None
+            decompress = None
+            #the open member has to be closed before the archive, even on error, or zipfile masks the error
+            try:
+                for object_index, body in reader.read(members):
+                    if object_index != current_index:
+                        if member_file is not None:
+                            member_file.close()
+                        current_index = object_index
+                        member = members[object_index]
+                        decompress = artifact_store.decompressor(member.get('content_encoding'))
+                        info = zipfile.ZipInfo(member['name'], date_time=member.get('date_time', (1980, 1, 1, 0, 0, 0)))
+                        info.compress_type = zipfile.ZIP_DEFLATED
+                        member_file = archive.open(info, mode='w', force_zip64=member['size'] > ZIP64_MEMBER_BYTES)
+                    data = decompress.decompress(body, MAX_DECOMPRESSED_CHUNK)
+                    member_file.write(data)
+                    while decompress.unconsumed_tail:
+                        member_file.write(decompress.decompress(decompress.unconsumed_tail, MAX_DECOMPRESSED_CHUNK))
+            finally:
+                if member_file is not None:
+                    member_file.close()
+        writer.complete()
+    except Exception:
+        writer.abort()
+        raise
+
+    return {
+        'members': len(members),
+        'bytes_written': writer.tell(),
+        'parts': len(writer.parts),
+        'peak_upload_buffer': writer.peak_buffered,
+        'peak_fetch_buffer': reader.peak_buffered,
+    }
@@ -0,0 +1,111 @@
+import re
+
+import numpy as np
+
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+')
+WORD_PATTERN = re.compile(r"[\w']+")
+#turns join every Transcribe item with a space, punctuation items included ("the release .")
+SPACE_BEFORE_PUNCTUATION = re.compile(r'\s+([.,!?;:])')
+
+#sentences shorter than this are usually filler ("Yeah.", "Okay, thanks.")
+MIN_SENTENCE_WORDS = 5
+MAX_SUMMARY_WORDS = 200
+DAMPING = 0.85
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-6
+#skip sentences that repeat one already chosen
+MAX_SIMILARITY = 0.8
+
+STOP_WORDS = frozenset("""
+a about after all also an and any are as at be because been but by can could did do does for from had has
+have he her his how i if in into is it its just like me more my no not of on or our out so some than that
+the their them then there these they this to up us was we were what when which who will with would you your
+yeah yes okay ok um uh right well know think going get got really thing things mean
+""".split())
+
+
+def split_sentences(turns):
+    """Split (speaker, text) turns into (speaker, sentence) pairs."""
+    sentences = []
+    for speaker, text in turns:
+        text = SPACE_BEFORE_PUNCTUATION.sub(r'\1', text.strip())
+        for sentence in SENTENCE_PATTERN.split(text):
+            if sentence:
+                sentences.append((speaker, sentence))
+    return sentences
+
+
+def tfidf_matrix(sentences):
+    """Row normalised TF-IDF matrix (sentences x vocabulary), float32 and updated in place."""
+    vocabulary = {}
+    rows = []
+    columns = []
+    for row, sentence in enumerate(sentences):
+        for word in WORD_PATTERN.findall(sentence.lower()):
+            if word in STOP_WORDS or len(word) < 3:
+                continue
+            rows.append(row)
+            columns.append(vocabulary.setdefault(word, len(vocabulary)))
+
+    matrix = np.zeros((len(sentences), max(1, len(vocabulary))), dtype=np.float32)
+    if not rows:
+        return matrix
+    np.add.at(matrix, (np.asarray(rows), np.asarray(columns)), 1.0)
+
+    document_frequency = np.count_nonzero(matrix, axis=0)
+    idf = np.log((1.0 + matrix.shape[0]) / (1.0 + document_frequency)).astype(np.float32) + 1.0
+    #the term frequency normalisation cancels out in the row normalisation, so only idf is applied
+    matrix *= idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.maximum(norms, 1e-12)
+    return matrix
+
+
+def textrank(similarity, damping=DAMPING, max_iterations=MAX_ITERATIONS, tolerance=TOLERANCE):
+    """Power iteration over the sentence similarity graph. Returns one score per sentence."""
+    count = similarity.shape[0]
+    transition = similarity.copy()
+    np.fill_diagonal(transition, 0.0)
+    out_weight = transition.sum(axis=1, keepdims=True)
+    transition /= np.maximum(out_weight, 1e-12)
+    #sentences with no similar sentences link evenly to all others
+    transition[out_weight[:, 0] <= 0] = 1.0 / count
+
+    scores = np.full(count, 1.0 / count, dtype=np.float32)
+    for _ in range(max_iterations):
+        updated = (1.0 - damping) / count + damping * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < tolerance:
+            return updated
+        scores = updated
+    return scores
+
+
+def summarise(turns, max_words=MAX_SUMMARY_WORDS):
+    """Extractive summary of (speaker, text) turns: the most central sentences, in meeting order.
+
+    CPU only - TF-IDF sentence vectors, cosine similarity graph, TextRank scores.
+    Returns the summary text (empty if there is nothing to summarise).
+    """
+    sentences = [(speaker, sentence) for speaker, sentence in split_sentences(turns)
+                 if len(sentence.split()) >= MIN_SENTENCE_WORDS]
+    if not sentences:
+        return ''
+
+    matrix = tfidf_matrix([sentence for _, sentence in sentences])
+    similarity = matrix @ matrix.T
+    scores = textrank(similarity)
+
+    chosen = []
+    words = 0
+    for index in np.argsort(-scores, kind='stable'):
+        if chosen and similarity[index, chosen].max() > MAX_SIMILARITY:
+            continue
+        sentence_words = len(sentences[index][1].split())
+        if chosen and words + sentence_words > max_words:
+            continue
+        chosen.append(int(index))
+        words += sentence_words
+        if words >= max_words:
+            break
+
+    return '\n'.join('{} - {}'.format(*sentences[index]) for index in sorted(chosen))
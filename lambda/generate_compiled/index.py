@@ -1,6 +1,8 @@
 import json
 import boto3
 import os
+import concurrent.futures
+from decimal import Decimal
 
 from langchain.prompts import PromptTemplate
 from langchain.docstore.document import Document
@@ -8,6 +10,12 @@ from langchain_aws import ChatBedrock
 from langchain.chains.summarize import load_summarize_chain
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+import artifact_store
+import extractive_summary
+import meeting_index
+import sentiment
+import structured_logger
+
 S3_BUCKET = os.environ.get('APPLICATION_BUCKET')
 SOURCE_PREFIX = os.environ.get('SOURCE_PREFIX')
 NOTES_PREFIX = os.environ.get('NOTES_PREFIX')
@@ -16,6 +24,10 @@ TRANSLATIONS_PREFIX = os.environ.get('TRANSLATIONS_PREFIX')
 BEDROCK_MODEL_ID = os.environ.get('BEDROCK_MODEL_ID')
 SES_SENDER_FROM = os.environ.get('SES_SENDER_FROM')
 DYNAMO_TABLE = os.environ.get('DYNAMODB_TABLE_NAME')
+EMBEDDINGS_PREFIX = os.environ.get('EMBEDDINGS_PREFIX')
+EMBEDDER = os.environ.get('EMBEDDER', 'bedrock')
+EMBEDDING_MODEL_ID = os.environ.get('EMBEDDING_MODEL_ID', 'amazon.titan-embed-text-v2:0')
+EMBEDDING_DIMENSIONS = int(os.environ.get('EMBEDDING_DIMENSIONS', '256'))
 send_email = os.environ.get('SES_SEND_EMAIL')
 
 s3_client = boto3.client('s3')
@@ -27,6 +39,8 @@ dynamodb_resource = boto3.resource('dynamodb')
 
 dynamo_table = dynamodb_resource.Table(DYNAMO_TABLE)
 
+logger = structured_logger.get_logger('generate_compiled')
+
 #add Bedrock runtime
 bedrock_runtime = boto3.client(service_name="bedrock-runtime")
 
@@ -41,8 +55,23 @@ claude_3_client = ChatBedrock(
     model_kwargs=model_kwargs,
 )
 
+#embedder for the question answering index
+embedder = meeting_index.create_embedder(
+    {'embedder': EMBEDDER, 'model_id': EMBEDDING_MODEL_ID, 'dimensions': EMBEDDING_DIMENSIONS},
+    bedrock_runtime
+)
+
+def store_embedding_index(transcript_name, transcript, docs):
+    #embed the summary chunks once so questions can be answered from the most relevant chunks
+    chunk_offsets = [(doc.metadata['start_index'], doc.metadata['start_index'] + len(doc.page_content)) for doc in docs]
+    index_bytes = meeting_index.build_index(embedder, transcript, chunk_offsets)
+    #stored uncompressed so readers can memory map it
+    artifact_store.put_artifact(s3_client, S3_BUCKET, '{}/{}.idx'.format(EMBEDDINGS_PREFIX, transcript_name),
+                                index_bytes, content_type='application/octet-stream', encoding='identity')
+    return len(chunk_offsets)
+
 def lambda_handler(event, context):
-    print(event)
+    logger.start_invocation(event, context)
 
     # Load transcript
     transcript_key = event['Records'][0]['s3']['object']['key']
@@ -53,9 +82,7 @@ def lambda_handler(event, context):
     source_uri = 's3://{}/{}'.format(S3_BUCKET, transcript_key)
     output_key = '{}/{}.txt'.format(NOTES_PREFIX, transcript_name)
 
-    s3_client.download_file(Bucket=S3_BUCKET, Key=transcript_key, Filename='/tmp/transcript.txt')
-    with open('/tmp/transcript.txt') as f:
-        contents = json.load(f)
+    contents = json.loads(artifact_store.get_artifact(s3_client, S3_BUCKET, transcript_key))
 
     # Get transcript from JSON
     transcript = contents['results']['transcripts'][0]['transcript']
@@ -65,6 +92,7 @@ def lambda_handler(event, context):
     #make a file of the transcript (by speaker), summary, and notes
     speaker = ""
     transcript_by_speaker = []
+    speaker_turns = []
     
     compiled_file = ["Original Transcript","",transcript,"","",""]
     
@@ -73,7 +101,6 @@ def lambda_handler(event, context):
     compiled_file.append("")
     count_speaker = 0
     
-    print("Start speaker loop")
     for part in contents['results']['items']:
         #very first iteration - make some defaults
         if(count_speaker == 0):
@@ -82,6 +109,7 @@ def lambda_handler(event, context):
         if(speaker != part['speaker_label']):
             #change of speaker - need to add the sentence to a list, and then empty it
             compiled_file.append(speaker+" - "+' '.join(transcript_by_speaker))
+            speaker_turns.append((speaker, ' '.join(transcript_by_speaker)))
             transcript_by_speaker = []
             speaker = part['speaker_label']
         
@@ -91,22 +119,50 @@ def lambda_handler(event, context):
         count_speaker+=1
     #if finished the loop - need to also add whats left to list
     compiled_file.append(speaker+" - "+' '.join(transcript_by_speaker))
+    speaker_turns.append((speaker, ' '.join(transcript_by_speaker)))
     
-    print("Finished speaker loop")
+    logger.info('grouped transcript by speaker', language=transcript_language,
+                turns=len(speaker_turns), transcript_chars=len(transcript))
+    
+    #local extractive draft - shown straight away, and used if the Bedrock summary fails
+    #backfills refresh meetings that already have a final summary, so they never show or fall back to the draft
+    backfill = bool(event.get('backfill'))
+    file_name = transcript_name.split("_")[0]
+    draft_summary = '' if backfill else extractive_summary.summarise(speaker_turns)
+    if draft_summary:
+        dynamo_table.update_item(
+            Key={'file_name': file_name},
+            UpdateExpression="set draft_summary=:d, combined_summary=:r, summary_source=:s",
+            ExpressionAttributeValues={
+                ':d': draft_summary,
+                ':r': "Draft summary - the full summary is still being generated.\n\n" + draft_summary,
+                ':s': 'draft' })
+        logger.info('stored draft summary', draft_chars=len(draft_summary))
+    
+    #chunk the transcript - used for the summary and the question answering index
+    text_splitter = RecursiveCharacterTextSplitter(
+        separators=["\n\n", "\n", ".", " "], chunk_size=1000, chunk_overlap=350, add_start_index=True
+    )
+    docs = text_splitter.create_documents([transcript])
+    
+    #start sentiment analysis and embedding in the background so they overlap with summarisation
+    background_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+    sentiment_future = None
+    sentiment_language = sentiment.comprehend_language(transcript_language)
+    if sentiment_language is not None:
+        sentiment_future = background_executor.submit(sentiment.analyse_turns, comprehend_client, speaker_turns, sentiment_language)
+    else:
+        logger.info('sentiment not supported for language', language=transcript_language)
+    index_future = background_executor.submit(store_embedding_index, transcript_name, transcript, docs)
     
     
     #start summarisation // chunk file.
     # Invoke endpoint with transcript and instructions
     results = {}
+    summary_source = 'bedrock'
 
     try:
         # Summarize transcript
-        text_splitter = RecursiveCharacterTextSplitter(
-            separators=["\n\n", "\n", ".", " "], chunk_size=1000, chunk_overlap=350 
-        )
-        splits = text_splitter.split_text(transcript)
-        docs = [Document(page_content=t) for t in splits]
-        
         map_prompt_template = "{text}\n\nWrite a few sentences in English summarizing the above:"
         map_prompt = PromptTemplate(template=map_prompt_template, input_variables=["text"])
         
@@ -121,34 +177,39 @@ def lambda_handler(event, context):
         else:
             results = chain.invoke(docs, return_only_outputs=True)
 
-        print(results)
-
-        compiled_file.append("")
-        compiled_file.append("")
-        compiled_file.append("Summarisation Results")
-        compiled_file.append("")
-        compiled_file.append("Summary")
-        compiled_file.append(results['output_text'])
-        compiled_file.append("")
-        compiled_file.append("Summary Chunks")
-        if(return_intermediate_steps):
-            for step in results["intermediate_steps"]:
-                compiled_file.append(step)
+        logger.info('summary generated', summary_chars=len(results['output_text']), chunks=len(docs))
+        logger.debug('summary results', results=results)
 
     except Exception as e:
-        print('Error generating text')
-        print(e)
-        raise
+        logger.exception('error generating text', e)
+        #throttled or failed - fall back to the extractive draft rather than losing the notes
+        #(a backfill re-raises instead, so it is retried rather than replacing a good summary)
+        if not draft_summary:
+            raise
+        results = {'output_text': draft_summary}
+        return_intermediate_steps = False
+        summary_source = 'extractive'
 
-    # Save response to S3
-    with open('/tmp/output.txt', 'w') as f:
-        json.dump(results, f)
+    compiled_file.append("")
+    compiled_file.append("")
+    compiled_file.append("Summarisation Results")
+    compiled_file.append("")
+    compiled_file.append("Summary")
+    if summary_source == 'extractive':
+        compiled_file.append("(Key sentences from the transcript - the full summary could not be generated)")
+    compiled_file.append(results['output_text'])
+    compiled_file.append("")
+    compiled_file.append("Summary Chunks")
+    if(return_intermediate_steps):
+        for step in results["intermediate_steps"]:
+            compiled_file.append(step)
 
-    s3_client.put_object(Bucket=S3_BUCKET, Key='{}/{}.txt'.format(NOTES_PREFIX, transcript_name), Body=open('/tmp/output.txt', 'rb'))
+    # Save response to S3
+    artifact_store.put_artifact(s3_client, S3_BUCKET, '{}/{}.txt'.format(NOTES_PREFIX, transcript_name),
+                                json.dumps(results), content_type='application/json')
     
-    print("attempting translate if not English")
     if(transcript_language_first2 != "en"):
-        print("language code from: "+transcript_language_first2)
+        logger.info('translating transcript', source_language=transcript_language_first2)
         #translate the transcript from english to french and store it
         translate_response = translate_client.translate_text(Text=transcript,
                                         SourceLanguageCode=transcript_language_first2,
@@ -160,43 +221,86 @@ def lambda_handler(event, context):
         compiled_file.append("Translation Results")
         compiled_file.append(translate_response['TranslatedText'])
         
-        with open('/tmp/translation_output.txt', 'w') as f:
-            json.dump(translate_response, f)
         #upload file to s3
-        s3_client.put_object(Bucket=S3_BUCKET, Key='{}/{}.txt'.format(TRANSLATIONS_PREFIX, transcript_name), Body=open('/tmp/translation_output.txt', 'rb'))
+        artifact_store.put_artifact(s3_client, S3_BUCKET, '{}/{}.txt'.format(TRANSLATIONS_PREFIX, transcript_name),
+                                    json.dumps(translate_response), content_type='application/json')
 
-    print("Translate complete")
+    
+    #add sentiment to compiled output
+    turn_sentiment = []
+    speaker_sentiment = {}
+    if sentiment_future is not None:
+        try:
+            turn_sentiment = sentiment_future.result()
+            speaker_sentiment = sentiment.aggregate_by_speaker(turn_sentiment)
+        except Exception as e:
+            #sentiment is supplementary - don't fail the notes if Comprehend fails
+            logger.exception('error detecting sentiment', e)
+
+    try:
+        logger.info('stored embedding index', chunks=index_future.result())
+    except Exception as e:
+        #question answering is supplementary - don't fail the notes if embedding fails
+        logger.exception('error building embedding index', e)
+    background_executor.shutdown(wait=False)
+
+    if speaker_sentiment:
+        compiled_file.append("")
+        compiled_file.append("")
+        compiled_file.append("Sentiment by Speaker")
+        compiled_file.append("")
+        for speaker_label, speaker_result in speaker_sentiment.items():
+            scores = ', '.join('{} {:.2f}'.format(label.lower(), score) for label, score in speaker_result['scores'].items())
+            compiled_file.append("{} - {} ({})".format(speaker_label, speaker_result['sentiment'], scores))
+        compiled_file.append("")
+        compiled_file.append("Sentiment by Speaker Turn")
+        compiled_file.append("")
+        for turn_number, turn_result in enumerate(turn_sentiment, start=1):
+            if turn_result is not None:
+                compiled_file.append("Turn {} - {} - {}".format(turn_number, turn_result['speaker'], turn_result['sentiment']))
     
     #send compiled file to S3    
-    print("start compiled file")
-    with open('/tmp/compiled.txt', mode='w', encoding='utf-8') as compiled_tmp_file:
-        compiled_tmp_file.write('\n'.join(compiled_file))
-    s3_client.put_object(Bucket=S3_BUCKET, Key='{}/{}.txt'.format(COMPILED_PREFIX, transcript_name), Body=open('/tmp/compiled.txt', 'rb'))
-    print("end compiled file")
+    artifact_store.put_artifact(s3_client, S3_BUCKET, '{}/{}.txt'.format(COMPILED_PREFIX, transcript_name),
+                                '\n'.join(compiled_file))
+    logger.info('stored compiled file', key='{}/{}.txt'.format(COMPILED_PREFIX, transcript_name))
     
     message = '\n'.join(compiled_file)
     
     # to do: get email address from DynamoDB from key (filename split by _)
-    print("get dynamodb user")
     search_key = transcript_name.split("_")
-    print("Search key: "+search_key[0])
     
     response = dynamodb_client.get_item(TableName=DYNAMO_TABLE, Key={'file_name':{'S':str(search_key[0])}})
-    print(response)
+    logger.debug('dynamodb item', found='Item' in response)
+
+    #dynamodb needs Decimal rather than float for numbers
+    speaker_sentiment_item = {
+        speaker_label: {
+            'sentiment': speaker_result['sentiment'],
+            'turns': speaker_result['turns'],
+            'scores': {label: Decimal(str(score)) for label, score in speaker_result['scores'].items()}
+        }
+        for speaker_label, speaker_result in speaker_sentiment.items()
+    }
+    turn_sentiment_item = [
+        {'speaker': turn_result['speaker'], 'sentiment': turn_result['sentiment']}
+        for turn_result in turn_sentiment if turn_result is not None
+    ]
 
     #add the message to the DynamoDB item
     update_response = dynamo_table.update_item(
         Key={'file_name': str(search_key[0]) },
-        UpdateExpression="set combined_summary=:r",
+        UpdateExpression="set combined_summary=:r, speaker_sentiment=:s, turn_sentiment=:t, summary_source=:u",
         ExpressionAttributeValues={
-            ':r': str(message) },
+            ':r': str(message),
+            ':s': speaker_sentiment_item,
+            ':t': turn_sentiment_item,
+            ':u': summary_source },
         ReturnValues="UPDATED_NEW")
     
-    print("Update item")
-    print(update_response)
-    print("end dynamodb")
+    logger.info('updated dynamodb item', file_name=search_key[0], message_chars=len(message))
 
-    if(send_email == "true"):
+    #backfill runs refresh existing notes - don't email the owner again
+    if(send_email == "true" and not backfill):
         email_sender = SES_SENDER_FROM
         email_recipient = response['Item']['file_owner']['S']
 
@@ -218,13 +322,14 @@ def lambda_handler(event, context):
                 }
             }
         )
-        print(email_response)
+        logger.info('sent email', message_id=email_response.get('MessageId'))
 
     # Return response
     return {
         'statusCode': 200,
         'body': {
             'message': json.dumps('Completed summary job {}'.format(transcript_name)),
-            'results': results
+            'results': results,
+            'summary_source': summary_source
         }
     }
@@ -0,0 +1,147 @@
+import concurrent.futures
+
+import structured_logger
+
+logger = structured_logger.get_logger('generate_compiled')
+
+#Comprehend BatchDetectSentiment limits
+MAX_BATCH_DOCUMENTS = 25
+MAX_DOCUMENT_BYTES = 5000
+MAX_CONCURRENT_BATCHES = 4
+
+SENTIMENT_SCORE_KEYS = {
+    'POSITIVE': 'Positive',
+    'NEGATIVE': 'Negative',
+    'NEUTRAL': 'Neutral',
+    'MIXED': 'Mixed',
+}
+
+#languages supported by Comprehend sentiment detection
+SUPPORTED_LANGUAGES = {'ar', 'de', 'en', 'es', 'fr', 'hi', 'it', 'ja', 'ko', 'pt', 'zh', 'zh-TW'}
+
+
+def comprehend_language(transcribe_language):
+    """Map a Transcribe language code (e.g. en-GB) to a Comprehend one, or None if unsupported."""
+    if transcribe_language == 'zh-TW':
+        return 'zh-TW'
+    language = transcribe_language[:2]
+    if language in SUPPORTED_LANGUAGES:
+        return language
+    return None
+
+
+def split_turn(text, limit=MAX_DOCUMENT_BYTES):
+    """Split a speaker turn into segments of at most `limit` UTF-8 bytes, on word boundaries."""
+    if len(text.encode('utf-8')) <= limit:
+        return [text]
+
+    segments = []
+    current = []
+    current_bytes = 0
+    for word in text.split():
+        word_bytes = len(word.encode('utf-8'))
+        if word_bytes > limit:
+            #a single word larger than the limit - cut it on a character boundary
+            word = word.encode('utf-8')[:limit].decode('utf-8', errors='ignore')
+            word_bytes = len(word.encode('utf-8'))
+        #+1 for the joining space
+        if current and current_bytes + 1 + word_bytes > limit:
+            segments.append(' '.join(current))
+            current = []
+            current_bytes = 0
+        current_bytes += word_bytes + (1 if current else 0)
+        current.append(word)
+    if current:
+        segments.append(' '.join(current))
+    return segments
+
+
+def pack_documents(turns, limit=MAX_DOCUMENT_BYTES, batch_size=MAX_BATCH_DOCUMENTS):
+    """Pack (speaker, text) turns into batches of Comprehend documents.
+
+    Returns a list of batches, each a list of (turn_index, segment) tuples.
+    """
+    documents = []
+    for turn_index, (speaker, text) in enumerate(turns):
+        if not text.strip():
+            continue
+        for segment in split_turn(text, limit):
+            documents.append((turn_index, segment))
+
+    return [documents[i:i + batch_size] for i in range(0, len(documents), batch_size)]
+
+
+def _detect_batch(comprehend_client, batch, language_code):
+    response = comprehend_client.batch_detect_sentiment(
+        TextList=[segment for _, segment in batch],
+        LanguageCode=language_code
+    )
+    results = []
+    for result in response.get('ResultList', []):
+        turn_index, segment = batch[result['Index']]
+        results.append((turn_index, len(segment.encode('utf-8')), result['SentimentScore']))
+    for error in response.get('ErrorList', []):
+        logger.warning('sentiment document failed', index=error['Index'], error=error.get('ErrorMessage'))
+    return results
+
+
+def _weighted_scores(weighted):
+    #weighted is a list of (weight, SentimentScore)
+    total = sum(weight for weight, _ in weighted)
+    scores = {}
+    for label, key in SENTIMENT_SCORE_KEYS.items():
+        scores[label] = sum(weight * score[key] for weight, score in weighted) / total
+    return scores
+
+
+def _summarise(scores):
+    return {
+        'sentiment': max(scores, key=scores.get),
+        'scores': {label: round(value, 4) for label, value in scores.items()},
+    }
+
+
+def analyse_turns(comprehend_client, turns, language_code, max_workers=MAX_CONCURRENT_BATCHES):
+    """Detect the sentiment of each (speaker, text) turn using concurrent BatchDetectSentiment calls.
+
+    Long turns are split into several documents and their scores combined, weighted by byte length.
+    Returns a list aligned with `turns`; turns with no result (empty or failed) are None.
+    """
+    batches = pack_documents(turns)
+    weighted_by_turn = {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_detect_batch, comprehend_client, batch, language_code) for batch in batches]
+        for future in futures:
+            for turn_index, weight, score in future.result():
+                weighted_by_turn.setdefault(turn_index, []).append((weight, score))
+
+    turn_results = []
+    for turn_index, (speaker, text) in enumerate(turns):
+        if turn_index not in weighted_by_turn:
+            turn_results.append(None)
+            continue
+        result = _summarise(_weighted_scores(weighted_by_turn[turn_index]))
+        result['speaker'] = speaker
+        result['weight'] = sum(weight for weight, _ in weighted_by_turn[turn_index])
+        turn_results.append(result)
+    return turn_results
+
+
+def aggregate_by_speaker(turn_results):
+    """Combine per turn results into one sentiment per speaker, weighted by the length of each turn."""
+    weighted_by_speaker = {}
+    turn_counts = {}
+    for result in turn_results:
+        if result is None:
+            continue
+        speaker = result['speaker']
+        scores = {SENTIMENT_SCORE_KEYS[label]: value for label, value in result['scores'].items()}
+        weighted_by_speaker.setdefault(speaker, []).append((result['weight'], scores))
+        turn_counts[speaker] = turn_counts.get(speaker, 0) + 1
+
+    speakers = {}
+    for speaker, weighted in weighted_by_speaker.items():
+        speakers[speaker] = _summarise(_weighted_scores(weighted))
+        speakers[speaker]['turns'] = turn_counts[speaker]
+    return speakers
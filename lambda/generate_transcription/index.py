@@ -2,14 +2,84 @@ import json
 import boto3
 import os
 import time
+from botocore.exceptions import ClientError
+
+import media_probe
+import structured_logger
 
 S3_BUCKET = os.environ.get('APPLICATION_BUCKET')
 SOURCE_PREFIX = os.environ.get('SOURCE_PREFIX')
 DESTINATION_PREFIX = os.environ.get('DESTINATION_PREFIX')
+DYNAMO_TABLE = os.environ.get('DYNAMODB_TABLE_NAME')
+MIN_UPLOAD_BYTES = int(os.environ.get('MIN_UPLOAD_BYTES', '1024'))
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', str(500 * 1024 * 1024)))
+MIN_DURATION_SECONDS = float(os.environ.get('MIN_DURATION_SECONDS', '1'))
+#Transcribe batch jobs are limited to 4 hours of audio
+MAX_DURATION_SECONDS = float(os.environ.get('MAX_DURATION_SECONDS', str(4 * 60 * 60)))
+#the first read covers the ID3 tag / MP4 ftyp box of almost every file
+HEADER_READ_BYTES = 65536
 
 transcribe_client = boto3.client('transcribe')
+s3_client = boto3.client('s3')
+dynamodb_client = boto3.client('dynamodb')
+
+logger = structured_logger.get_logger('generate_transcription')
+
+def ranged_reader(bucket, key):
+    #serve reads from the first block where possible, with a ranged GET for anything beyond it
+    head = s3_client.get_object(Bucket=bucket, Key=key, Range='bytes=0-{}'.format(HEADER_READ_BYTES - 1))['Body'].read()
+
+    def read_range(start, length):
+        if start + length <= len(head) or len(head) < HEADER_READ_BYTES:
+            return head[start:start + length]
+        range_header = 'bytes={}-{}'.format(start, start + length - 1)
+        return s3_client.get_object(Bucket=bucket, Key=key, Range=range_header)['Body'].read()
+    return read_range
+
+def validate_recording(bucket, key, media_format):
+    """Check the size, header and duration of an upload. Returns the duration or raises InvalidMedia."""
+    size = s3_client.head_object(Bucket=bucket, Key=key)['ContentLength']
+    if size < MIN_UPLOAD_BYTES or size > MAX_UPLOAD_BYTES:
+        raise media_probe.InvalidMedia("File size {} bytes is outside the allowed range".format(size))
+
+    duration = media_probe.probe_duration(ranged_reader(bucket, key), size, media_format)
+    if duration < MIN_DURATION_SECONDS or duration > MAX_DURATION_SECONDS:
+        raise media_probe.InvalidMedia("Duration {:.0f} seconds is outside the allowed range".format(duration))
+    return duration
+
+def update_upload_row(file_name, update_expression, values):
+    #only update rows created by pre_signed_url - creating one here would leave a row with no owner or expiry
+    try:
+        dynamodb_client.update_item(
+            TableName=DYNAMO_TABLE,
+            Key={'file_name': {'S': file_name}},
+            UpdateExpression=update_expression,
+            ConditionExpression='attribute_exists(file_name)',
+            ExpressionAttributeValues=values
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        logger.warning('no upload row for recording', file_name=file_name)
+
+def reject_recording(bucket, key, file_name, reason):
+    #remove the upload and mark the row - it keeps its expiry so DynamoDB TTL removes it later
+    s3_client.delete_object(Bucket=bucket, Key=key)
+    update_upload_row(file_name, "set upload_status=:s, combined_summary=:r", {
+        ':s': {'S': 'rejected'},
+        ':r': {'S': 'File rejected - {}'.format(reason)}
+    })
+
+def accept_recording(file_name, duration):
+    #an upload arrived, so the row should no longer expire
+    update_upload_row(file_name, "set upload_status=:s, duration_seconds=:d remove expires_at", {
+        ':s': {'S': 'uploaded'},
+        ':d': {'N': str(int(duration))}
+    })
 
 def lambda_handler(event, context):
+    logger.start_invocation(event, context)
+
     # Transcribe meeting recording to text
     recording_name = event['Records'][0]['s3']['object']['key']
     job_tokens = recording_name.split('/')[1].split('.')
@@ -19,6 +89,18 @@ def lambda_handler(event, context):
     media_uri = 's3://{}/{}'.format(S3_BUCKET, recording_name)
     output_key = '{}/{}.txt'.format(DESTINATION_PREFIX, job_tokens[0])
 
+    #reject bad uploads before paying for a transcription job
+    try:
+        duration = validate_recording(S3_BUCKET, recording_name, media_format)
+    except media_probe.InvalidMedia as e:
+        logger.warning('rejected recording', key=recording_name, reason=str(e))
+        reject_recording(S3_BUCKET, recording_name, job_tokens[0], str(e))
+        return {
+            'statusCode': 400,
+            'body': json.dumps('Rejected recording {}: {}'.format(recording_name, e))
+        }
+    accept_recording(job_tokens[0], duration)
+
     try:
         job_args = {
             'TranscriptionJobName': job_name,
@@ -30,9 +112,9 @@ def lambda_handler(event, context):
         }
         response = transcribe_client.start_transcription_job(**job_args)
         job = response['TranscriptionJob']
-        print("Started transcription job {}.".format(job_name))
-    except Exception:
-        print("Couldn't start transcription job %s.".format(job_name))
+        logger.info('started transcription job', job_name=job_name)
+    except Exception as e:
+        logger.exception("couldn't start transcription job", e, job_name=job_name)
         raise
 
     return {
@@ -0,0 +1,164 @@
+import struct
+
+#MPEG audio tables, indexed by version (1, 2 or 2.5 stored as 25) and layer
+MPEG_VERSIONS = {0: 25, 2: 2, 3: 1}
+MPEG_LAYERS = {1: 3, 2: 2, 3: 1}
+MPEG_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MPEG_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 25: [11025, 12000, 8000]}
+
+#how far to look for the first MPEG frame after any ID3 tag
+MAX_SYNC_SEARCH_BYTES = 16384
+MAX_TOP_LEVEL_BOXES = 64
+
+
+class InvalidMedia(ValueError):
+    pass
+
+
+def _mpeg_frame(header):
+    """Parse a 4 byte MPEG audio frame header, or return None if it isn't one."""
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version = MPEG_VERSIONS.get((header[1] >> 3) & 3)
+    layer = MPEG_LAYERS.get((header[1] >> 1) & 3)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 3
+    if version is None or layer is None or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    bitrate = MPEG_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = MPEG_SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 1
+    if layer == 1:
+        samples_per_frame = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples_per_frame = 1152 if (layer == 2 or version == 1) else 576
+        length = samples_per_frame // 8 * bitrate // sample_rate + padding
+    return {
+        'version': version,
+        'layer': layer,
+        'bitrate': bitrate,
+        'sample_rate': sample_rate,
+        'samples_per_frame': samples_per_frame,
+        'mono': (header[3] >> 6) == 3,
+        'length': length,
+    }
+
+
+def probe_mp3(read_range, size):
+    """Duration of an MP3 in seconds, from the Xing/Info or VBRI header if present, otherwise the bitrate."""
+    head = read_range(0, 10)
+    audio_start = 0
+    if head[:3] == b'ID3':
+        #ID3v2 tag size is a 28 bit synchsafe integer
+        tag_size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+        audio_start = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+
+    data = read_range(audio_start, MAX_SYNC_SEARCH_BYTES)
+    for offset in range(max(0, len(data) - 3)):
+        frame = _mpeg_frame(data[offset:offset + 4])
+        if frame is None:
+            continue
+        #confirm the sync with the following frame header, when it's within what was read
+        following = offset + frame['length']
+        if following + 4 <= len(data) and _mpeg_frame(data[following:following + 4]) is None:
+            continue
+        break
+    else:
+        raise InvalidMedia("No MPEG audio frames found")
+
+    frame_data = data[offset:]
+    audio_start += offset
+    if frame['layer'] == 3:
+        if frame['version'] == 1:
+            side_info = 17 if frame['mono'] else 32
+        else:
+            side_info = 9 if frame['mono'] else 17
+        xing = 4 + side_info
+        if frame_data[xing:xing + 4] in (b'Xing', b'Info'):
+            flags = struct.unpack('>I', frame_data[xing + 4:xing + 8])[0]
+            if flags & 1:
+                frames = struct.unpack('>I', frame_data[xing + 8:xing + 12])[0]
+                return frames * frame['samples_per_frame'] / frame['sample_rate']
+        if frame_data[36:40] == b'VBRI':
+            frames = struct.unpack('>I', frame_data[50:54])[0]
+            return frames * frame['samples_per_frame'] / frame['sample_rate']
+
+    return (size - audio_start) * 8 / frame['bitrate']
+
+
+def _boxes(read_range, start, end, limit=MAX_TOP_LEVEL_BOXES):
+    """Yield (type, payload_start, box_end) for the ISO media boxes between start and end."""
+    offset = start
+    for _ in range(limit):
+        if offset + 8 > end:
+            return
+        header = read_range(offset, 16)
+        if len(header) < 8:
+            return
+        box_size, box_type = struct.unpack('>I4s', header[:8])
+        header_size = 8
+        if box_size == 1:
+            if len(header) < 16:
+                return
+            box_size = struct.unpack('>Q', header[8:16])[0]
+            header_size = 16
+        elif box_size == 0:
+            box_size = end - offset
+        if box_size < header_size:
+            raise InvalidMedia("Corrupt MP4 box")
+        yield box_type, offset + header_size, offset + box_size
+        offset += box_size
+
+
+def probe_m4a(read_range, size):
+    """Duration of an MPEG-4 audio file in seconds, from the movie header (mvhd) box."""
+    boxes = _boxes(read_range, 0, size)
+    first = next(boxes, None)
+    if first is None or first[0] != b'ftyp':
+        raise InvalidMedia("Not an MPEG-4 file")
+
+    for box_type, payload_start, box_end in boxes:
+        if box_type != b'moov':
+            continue
+        for child_type, child_start, child_end in _boxes(read_range, payload_start, box_end):
+            if child_type != b'mvhd':
+                continue
+            mvhd = read_range(child_start, 32)
+            if mvhd[0] == 1:
+                timescale, duration = struct.unpack('>IQ', mvhd[20:32])
+            else:
+                timescale, duration = struct.unpack('>II', mvhd[12:20])
+            if timescale == 0:
+                raise InvalidMedia("Invalid MP4 timescale")
+            return duration / timescale
+        break
+    raise InvalidMedia("No MP4 movie header found")
+
+
+PROBES = {
+    'mp3': probe_mp3,
+    'm4a': probe_m4a,
+}
+
+
+def probe_duration(read_range, size, file_format):
+    """Check the file header matches the format and return its duration in seconds.
+
+    `read_range(start, length)` returns up to `length` bytes from `start` - e.g. an S3 ranged GET.
+    Raises InvalidMedia if the content doesn't look like the format it was uploaded as.
+    """
+    if file_format not in PROBES:
+        raise InvalidMedia("Unsupported format: {}".format(file_format))
+    try:
+        return PROBES[file_format](read_range, size)
+    except (struct.error, IndexError) as e:
+        raise InvalidMedia("Truncated {} header".format(file_format)) from e
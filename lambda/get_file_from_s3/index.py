@@ -3,6 +3,8 @@ import boto3
 import os
 from boto3.dynamodb.conditions import And, Attr
 
+import structured_logger
+
 DYNAMO_TABLE = os.environ.get('DYNAMODB_TABLE_NAME')
 S3_BUCKET = os.environ.get('APPLICATION_BUCKET')
 SOURCE_PREFIX = os.environ.get('SOURCE_PREFIX')
@@ -12,8 +14,10 @@ COMPILED_PREFIX = os.environ.get('COMPILED_PREFIX')
 s3_client = boto3.client('s3')
 dynamodb_client = boto3.client('dynamodb')
 
+logger = structured_logger.get_logger('get_file_from_s3')
+
 def lambda_handler(event, context):
-    print(event)
+    logger.start_invocation(event, context)
 
     search_key = event['queryStringParameters']['file']
     dynamodb_key = event['requestContext']['authorizer']['claims']['email']
@@ -23,7 +27,7 @@ def lambda_handler(event, context):
     #check dynamodb_response for errors
     #and exit if found
     if 'Item' not in dynamodb_response:
-        print("No item found in dynamodb")
+        logger.info('no item found in dynamodb')
         return {
             'statusCode': 200,
             'body': json.dumps("No item found in dynamodb"),
@@ -33,7 +37,7 @@ def lambda_handler(event, context):
             }
         }
     else:
-        print("Item found in dynamodb")
+        logger.info('item found in dynamodb', file_name=search_key)
 
         return {
             'statusCode': 200,
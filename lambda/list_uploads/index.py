@@ -1,8 +1,12 @@
 import json
 import boto3
 import os
+import time
+from decimal import Decimal
 from boto3.dynamodb.conditions import And, Attr
 
+import structured_logger
+
 DYNAMO_TABLE = os.environ.get('DYNAMODB_TABLE_NAME')
 S3_BUCKET = os.environ.get('APPLICATION_BUCKET')
 SOURCE_PREFIX = os.environ.get('SOURCE_PREFIX')
@@ -13,21 +17,34 @@ s3_client = boto3.client('s3')
 dynamodb_client = boto3.resource('dynamodb')
 table = dynamodb_client.Table(DYNAMO_TABLE)
 
+logger = structured_logger.get_logger('list_uploads')
+
+
+def json_default(value):
+    #the dynamodb resource returns numbers (sentiment scores, expiry times) as Decimal
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError("Object of type {} is not JSON serializable".format(type(value).__name__))
+
+
 def lambda_handler(event, context):
-    print(event)
+    logger.start_invocation(event, context)
 
     dynamodb_key = event['requestContext']['authorizer']['claims']['email']
 
     #get json of objects from dynamodb using dynamodb_key
+    #pending rows for uploads that never arrived are hidden once they expire - TTL deletion can lag by days
     dynamodb_response = table.scan(
-        FilterExpression=Attr("file_owner").eq(dynamodb_key)
+        FilterExpression=And(
+            Attr("file_owner").eq(dynamodb_key),
+            Attr("expires_at").not_exists() | Attr("expires_at").gt(int(time.time()))
+        )
     )
-    print(dynamodb_response)
 
     #check dynamodb_response for errors
     #and exit if found
     if 'Items' not in dynamodb_response:
-        print("No item found in dynamodb")
+        logger.info('no item found in dynamodb')
         return {
             'statusCode': 200,
             'body': json.dumps("No item found in dynamodb"),
@@ -37,13 +54,13 @@ def lambda_handler(event, context):
             }
         }
     else:
-        print("Item found in dynamodb")
         return_items = dynamodb_response['Items']
+        logger.info('items found in dynamodb', count=len(return_items))
         return_items.sort(key=lambda x: x['file_timestamp'], reverse=True)
 
         return {
             'statusCode': 200,
-            'body': json.dumps(return_items),
+            'body': json.dumps(return_items, default=json_default),
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
@@ -1,6 +1,5 @@
 import os
 import json
-import logging
 import boto3
 import uuid
 import datetime
@@ -8,15 +7,26 @@ import datetime
 from botocore.exceptions import ClientError
 from botocore.client import Config
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+import structured_logger
+
+logger = structured_logger.get_logger('pre_signed_url')
+
+#content type the upload must be sent with, per allowed extension
+CONTENT_TYPES = {
+    'mp3': 'audio/mpeg',
+    'm4a': 'audio/mp4',
+}
+MIN_UPLOAD_BYTES = int(os.environ.get('MIN_UPLOAD_BYTES', '1024'))
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', str(500 * 1024 * 1024)))
+#rows for uploads that never arrive are removed by DynamoDB TTL after this long
+UPLOAD_ROW_TTL_SECONDS = int(os.environ.get('UPLOAD_ROW_TTL_SECONDS', '3600'))
+UPLOAD_URL_EXPIRY_SECONDS = 120
 
 dynamodb = boto3.client('dynamodb')
 ses = boto3.client('ses', region_name='eu-west-1')
 
 def lambda_handler(event, context):
-
-    print(event)
+    logger.start_invocation(event, context)
 
     #generate random S3 filename - this will prevent users uploading the same filename more than once
     filename_uuid = str(uuid.uuid4())
@@ -36,17 +46,17 @@ def lambda_handler(event, context):
     transcript_name = tokens[0]
     file_format = tokens[1]
 
-    allowed_files = {"mp3","m4a"}
-    if file_format in allowed_files:
-        print("Exists")
+    if file_format in CONTENT_TYPES:
+        content_type = CONTENT_TYPES[file_format]
         key = prefix+"/"+filename_uuid+"."+file_format
 
         current_time = datetime.datetime.now()
         time_stamp = current_time.timestamp()
 
         file_timestamp = str(int(time_stamp))
+        expires_at = str(int(time_stamp) + UPLOAD_ROW_TTL_SECONDS)
 
-        dynamodb.put_item(TableName=dynamo_table, Item={'file_name':{'S':filename_uuid},'file_owner':{'S':authenticated_email},'file_timestamp':{'S': file_timestamp }, 'file_original': {'S': transcript_key} , 'combined_summary': {'S':str("File summary not ready yet - please try again in a few moments.") } } )
+        dynamodb.put_item(TableName=dynamo_table, Item={'file_name':{'S':filename_uuid},'file_owner':{'S':authenticated_email},'file_timestamp':{'S': file_timestamp }, 'file_original': {'S': transcript_key} , 'combined_summary': {'S':str("File summary not ready yet - please try again in a few moments.") }, 'upload_status': {'S': 'pending'}, 'expires_at': {'N': expires_at} } )
     
         if(send_email == "true"):
             email_sender = os.environ.get('SES_SENDER_FROM')
@@ -76,22 +86,35 @@ def lambda_handler(event, context):
         #2 - when first spinning up the environment the domain name isn't resolved so you get a 307 response for the cors request causing the browser to 500 error
         s3_client = boto3.client('s3', config=Config(signature_version='s3v4', s3={'addressing_style': 'path'}))
     
-        #try to generate put object pre signed URL
+        #try to generate pre signed POST - S3 rejects uploads of the wrong size or content type
         try:
             #try to generate URL // 2 minute timeline for submission
-            response = s3_client.generate_presigned_url('put_object',Params={'Bucket': bucket, 'Key': key }, ExpiresIn=120)
+            response = s3_client.generate_presigned_post(
+                Bucket=bucket,
+                Key=key,
+                Fields={'Content-Type': content_type},
+                Conditions=[
+                    {'Content-Type': content_type},
+                    ['content-length-range', MIN_UPLOAD_BYTES, MAX_UPLOAD_BYTES]
+                ],
+                ExpiresIn=UPLOAD_URL_EXPIRY_SECONDS
+            )
         except ClientError as e:
+            logger.exception('error generating pre signed url', e)
             return_message = e.response['Error']['Message']
             return_status=500
         else:
+            logger.info('pre signed url generated', key=key)
             #create object for return message
             return_message = {
                     'key':key,
-                    'pre_signed_url': response
+                    'pre_signed_url': response['url'],
+                    'fields': response['fields'],
+                    'max_size': MAX_UPLOAD_BYTES
                 }
             return_status=200
     else:
-        print("Does not exist")
+        logger.warning('file type not allowed', file_format=file_format)
         return_status=500
         return_message = "Not allowed file type"
 
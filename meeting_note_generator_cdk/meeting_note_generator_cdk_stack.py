@@ -15,6 +15,7 @@ from aws_cdk import (
     aws_wafv2 as _wafv2,
     Tags,
     Duration,
+    Size,
     RemovalPolicy,
     CfnOutput
 )
@@ -26,10 +27,15 @@ class MeetingNoteGeneratorCdkStack(Stack):
         super().__init__(scope, construct_id, **kwargs)
 
         self.bedrock_model_id = "anthropic.claude-3-haiku-20240307-v1:0"
+        self.embedding_model_id = "amazon.titan-embed-text-v2:0"
         self.origins = ['http://localhost:3000']
         self.ses_default_from_email = "email@address"
         self.setup_ses_email_identity = False
         self.send_email = "false"
+        #uploads outside these limits are refused by S3 or rejected before transcription
+        self.min_upload_bytes = 1024
+        self.max_upload_bytes = 500 * 1024 * 1024
+        self.max_duration_seconds = 4 * 60 * 60
 
         #create logging bucket
         self.logging_bucket = s3.Bucket(self, 'notes_application_logs_bucket',
@@ -49,8 +55,15 @@ class MeetingNoteGeneratorCdkStack(Stack):
             block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
             cors=[s3.CorsRule(
                 allowed_headers=["*"],
-                allowed_methods=[s3.HttpMethods.PUT],
+                allowed_methods=[s3.HttpMethods.PUT, s3.HttpMethods.POST],
                 allowed_origins=self.origins)
+            ],
+            #exported archives are only kept long enough to download them
+            lifecycle_rules=[
+                #the bucket is versioned, so expired exports also need their noncurrent versions and delete markers removed
+                s3.LifecycleRule(prefix='exports/', expiration=Duration.days(1), noncurrent_version_expiration=Duration.days(1)),
+                s3.LifecycleRule(prefix='exports/', expired_object_delete_marker=True),
+                s3.LifecycleRule(abort_incomplete_multipart_upload_after=Duration.days(1))
             ]
         )
 
@@ -108,7 +121,16 @@ class MeetingNoteGeneratorCdkStack(Stack):
             billing_mode=_dynamodb.BillingMode.PAY_PER_REQUEST,
             removal_policy=RemovalPolicy.DESTROY,
             encryption=_dynamodb.TableEncryption.AWS_MANAGED,
-            point_in_time_recovery=True
+            point_in_time_recovery=True,
+            #rows for uploads that never arrived expire automatically
+            time_to_live_attribute='expires_at'
+        )
+
+        #shared code for the Lambda functions (compressed artifact storage)
+        self.common_layer = _lambda.LayerVersion(self, 'lambda_common_layer',
+            code=_lambda.Code.from_asset('lambda/common_layer'),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_11],
+            description='Shared helpers for the meeting notes Lambda functions'
         )
 
         self.lambda_generate_transcription = _lambda.Function(self, 'lambda_generate_transcription',
@@ -117,11 +139,16 @@ class MeetingNoteGeneratorCdkStack(Stack):
             runtime=_lambda.Runtime.PYTHON_3_11,
             timeout=Duration.seconds(60),
             memory_size=256,
+            layers=[self.common_layer],
             environment={
                 'LOG_BUCKET': self.logging_bucket.bucket_name,
                 'APPLICATION_BUCKET': self.application_bucket.bucket_name,
                 'SOURCE_PREFIX': 'recordings',
-                'DESTINATION_PREFIX': 'transcripts'
+                'DESTINATION_PREFIX': 'transcripts',
+                'DYNAMODB_TABLE_NAME': self.upload_storage_table.table_name,
+                'MIN_UPLOAD_BYTES': str(self.min_upload_bytes),
+                'MAX_UPLOAD_BYTES': str(self.max_upload_bytes),
+                'MAX_DURATION_SECONDS': str(self.max_duration_seconds),
             }
         )
         #add event notification from S3 upload to trigger Lambda
@@ -136,10 +163,11 @@ class MeetingNoteGeneratorCdkStack(Stack):
         )
         self.lambda_generate_transcription_policy = _iam.PolicyStatement(
             effect=_iam.Effect.ALLOW,
-            actions=['s3:GetObject','s3:PutObject','logs:CreateLogGroup','logs:CreateLogStream','logs:PutLogEvents'],
+            actions=['s3:GetObject','s3:PutObject','s3:DeleteObject','logs:CreateLogGroup','logs:CreateLogStream','logs:PutLogEvents'],
             resources=['*']
         )
         self.lambda_generate_transcription.add_to_role_policy(self.lambda_generate_transcription_policy)
+        self.upload_storage_table.grant_read_write_data(self.lambda_generate_transcription)
         #allow S3 to call Lambda
         self.lambda_generate_transcription.add_permission(
             's3-service-principal', 
@@ -156,6 +184,7 @@ class MeetingNoteGeneratorCdkStack(Stack):
             timeout=Duration.seconds(300),
             memory_size=2048,
             handler='lambda_handler',
+            layers=[self.common_layer],
             environment={
                 'LOG_BUCKET': self.logging_bucket.bucket_name,
                 'APPLICATION_BUCKET': self.application_bucket.bucket_name,
@@ -167,6 +196,12 @@ class MeetingNoteGeneratorCdkStack(Stack):
                 'SES_SENDER_FROM': self.ses_default_from_email,
                 'SES_SEND_EMAIL': self.send_email,
                 'DYNAMODB_TABLE_NAME': self.upload_storage_table.table_name,
+                'ARTIFACT_ENCODING': 'gzip',
+                'EMBEDDINGS_PREFIX': 'embeddings',
+                'EMBEDDER': 'bedrock',
+                'EMBEDDING_MODEL_ID': self.embedding_model_id,
+                'LOG_LEVEL': 'INFO',
+                'LOG_DEBUG_SAMPLE_RATE': '0.01',
             }
         )
         #add event notification from S3 upload to trigger Lambda only if .txt file
@@ -185,7 +220,7 @@ class MeetingNoteGeneratorCdkStack(Stack):
             effect=_iam.Effect.ALLOW,
             actions=['s3:GetObject','s3:PutObject','dynamodb:GetItem',
                      'logs:CreateLogGroup','logs:CreateLogStream','logs:PutLogEvents',
-                     'comprehend:DetectSentiment',
+                     'comprehend:DetectSentiment','comprehend:BatchDetectSentiment',
                      'translate:TranslateText',
                      'bedrock:InvokeModel','dynamodb:UpdateItem'],
             resources=['*'],
@@ -196,6 +231,8 @@ class MeetingNoteGeneratorCdkStack(Stack):
         self.api_gateway = _apigateway.RestApi(self, 'meeting_notes_api',
             rest_api_name='MeetingNotesApi',
             description='Meeting Notes API',
+            #gzip responses larger than 1KB for clients sending Accept-Encoding
+            min_compression_size=Size.kibibytes(1),
             deploy_options=_apigateway.StageOptions(
                 stage_name='dev',
                 tracing_enabled=True,
@@ -260,12 +297,15 @@ class MeetingNoteGeneratorCdkStack(Stack):
             runtime=_lambda.Runtime.PYTHON_3_11,
             timeout=Duration.seconds(30),
             memory_size=256,
+            layers=[self.common_layer],
             environment={
                 'APPLICATION_BUCKET': self.application_bucket.bucket_name,
                 'SOURCE_PREFIX': 'recordings',
                 'DYNAMODB_TABLE_NAME': self.upload_storage_table.table_name,
                 'SES_SENDER_FROM': self.ses_default_from_email,
-                'SES_SEND_EMAIL': self.send_email
+                'SES_SEND_EMAIL': self.send_email,
+                'MIN_UPLOAD_BYTES': str(self.min_upload_bytes),
+                'MAX_UPLOAD_BYTES': str(self.max_upload_bytes),
             }
         )
         self.application_bucket.grant_read_write(self.generate_pre_signed_url_lambda)
@@ -279,6 +319,7 @@ class MeetingNoteGeneratorCdkStack(Stack):
             runtime=_lambda.Runtime.PYTHON_3_11,
             timeout=Duration.seconds(30),
             memory_size=256,
+            layers=[self.common_layer],
             environment={
                 'LOG_BUCKET': self.logging_bucket.bucket_name,
                 'APPLICATION_BUCKET': self.application_bucket.bucket_name,
@@ -299,6 +340,7 @@ class MeetingNoteGeneratorCdkStack(Stack):
             runtime=_lambda.Runtime.PYTHON_3_11,
             timeout=Duration.seconds(30),
             memory_size=256,
+            layers=[self.common_layer],
             environment={
                 'LOG_BUCKET': self.logging_bucket.bucket_name,
                 'APPLICATION_BUCKET': self.application_bucket.bucket_name,
@@ -312,6 +354,64 @@ class MeetingNoteGeneratorCdkStack(Stack):
         self.application_bucket.grant_read_write(self.get_file_from_s3_lambda)
         self.upload_storage_table.grant_read_write_data(self.get_file_from_s3_lambda)
 
+        #answer questions about a meeting from its embedding index
+        self.ask_meeting_lambda = _lambda_python.PythonFunction(self, 'ask_meeting_lambda',
+            entry='lambda/ask_meeting',
+            index='index.py',
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            timeout=Duration.seconds(60),
+            memory_size=512,
+            handler='lambda_handler',
+            layers=[self.common_layer],
+            environment={
+                'APPLICATION_BUCKET': self.application_bucket.bucket_name,
+                'EMBEDDINGS_PREFIX': 'embeddings',
+                'BEDROCK_MODEL_ID': self.bedrock_model_id,
+                'DYNAMODB_TABLE_NAME': self.upload_storage_table.table_name,
+            }
+        )
+        self.application_bucket.grant_read(self.ask_meeting_lambda)
+        self.upload_storage_table.grant_read_data(self.ask_meeting_lambda)
+        self.ask_meeting_lambda.add_to_role_policy(_iam.PolicyStatement(
+            effect=_iam.Effect.ALLOW,
+            actions=['bedrock:InvokeModel'],
+            resources=['*'],
+        ))
+
+        #export all of a user's meetings as a zip - the worker streams the archive into a multipart upload
+        self.export_environment = {
+            'APPLICATION_BUCKET': self.application_bucket.bucket_name,
+            'NOTES_PREFIX': 'notes',
+            'COMPILED_PREFIX': 'compiled',
+            'TRANSLATIONS_PREFIX': 'translations',
+            'EXPORTS_PREFIX': 'exports',
+            'DYNAMODB_TABLE_NAME': self.upload_storage_table.table_name,
+        }
+        self.export_meetings_worker_lambda = _lambda.Function(self, 'export_meetings_worker_lambda',
+            code=_lambda.Code.from_asset('lambda/export_meetings'),
+            handler='index.export_handler',
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            timeout=Duration.seconds(900),
+            memory_size=512,
+            layers=[self.common_layer],
+            environment=self.export_environment
+        )
+        self.application_bucket.grant_read_write(self.export_meetings_worker_lambda)
+        self.upload_storage_table.grant_read_data(self.export_meetings_worker_lambda)
+
+        self.export_meetings_lambda = _lambda.Function(self, 'export_meetings_lambda',
+            code=_lambda.Code.from_asset('lambda/export_meetings'),
+            handler='index.lambda_handler',
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            timeout=Duration.seconds(30),
+            memory_size=256,
+            layers=[self.common_layer],
+            environment=dict(self.export_environment,
+                EXPORT_WORKER_FUNCTION=self.export_meetings_worker_lambda.function_name)
+        )
+        self.application_bucket.grant_read(self.export_meetings_lambda)
+        self.export_meetings_worker_lambda.grant_invoke(self.export_meetings_lambda)
+
         #ensure api call for pre signed URL needs cognito auth
         self.api_pre_signed = self.api_gateway.root.add_resource('pre_signed_url')
         self.api_pre_signed_post_method = self.api_pre_signed.add_method(
@@ -343,7 +443,32 @@ class MeetingNoteGeneratorCdkStack(Stack):
             authorization_type=_apigateway.AuthorizationType.COGNITO
         )
 
+        #ask a question about a meeting
+        self.api_ask = self.api_gateway.root.add_resource('ask')
+        self.api_ask_post = self.api_ask.add_method(
+            http_method='POST',
+            integration=_apigateway.LambdaIntegration(
+                handler=self.ask_meeting_lambda
+            ),
+            authorizer=self.api_gateway_auth,
+            authorization_type=_apigateway.AuthorizationType.COGNITO
+        )
+
+        #start an export (POST) and check its status / get the download link (GET)
+        self.api_export = self.api_gateway.root.add_resource('export')
+        for export_method in ('GET', 'POST'):
+            self.api_export.add_method(
+                http_method=export_method,
+                integration=_apigateway.LambdaIntegration(
+                    handler=self.export_meetings_lambda
+                ),
+                authorizer=self.api_gateway_auth,
+                authorization_type=_apigateway.AuthorizationType.COGNITO
+            )
+
         CfnOutput(self, 'UserPoolID', value=self.cognito_user_pool.user_pool_id)
         CfnOutput(self, 'UserPoolClientID', value=self.cognito_user_pool_client.user_pool_client_id)
+        CfnOutput(self, 'GenerateCompiledFunctionName', value=self.lambda_generate_compiled.function_name)
+        CfnOutput(self, 'UploadTableName', value=self.upload_storage_table.table_name)
         
         Tags.of(self).add('Application','MeetingNotesApp')
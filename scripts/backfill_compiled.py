@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""Re-run the compiled notes pipeline over existing transcripts, without re-running Transcribe.
+
+Lists the transcripts in the application bucket, optionally filters them by owner and upload date,
+and invokes the generate_compiled Lambda for each one with a synthetic S3 event. Progress is written
+to a checkpoint file named after the run id, so an interrupted run can be resumed with --run-id.
+
+Example:
+
+    python scripts/backfill_compiled.py --bucket <application bucket> --function-name <generate compiled function> \\
+        --table <upload table> --owner user@example.com --since 2024-01-01 --concurrency 4 --rate 2
+
+Use --dry-run to list what would be processed, with a rough Bedrock/Comprehend cost estimate
+(translation of non English meetings is not included).
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import threading
+import time
+
+SOURCE_PREFIX = 'transcripts'
+THROTTLING_ERRORS = {'TooManyRequestsException', 'ThrottlingException', 'Throttling'}
+MAX_ATTEMPTS = 5
+
+#rough ratio of transcript text to Transcribe JSON size, used by the dry run estimate
+TEXT_CHARS_PER_JSON_BYTE = 0.05
+CHARS_PER_TOKEN = 4
+#chunks of 1000 chars with 350 overlap, and the summary chain's output per chunk
+CHUNK_CHARS = 1000
+CHUNK_OVERLAP = 350
+MAP_OUTPUT_TOKENS = 80
+REDUCE_OUTPUT_TOKENS = 300
+#Comprehend bills sentiment in units of 100 characters
+COMPREHEND_UNIT_CHARS = 100
+
+#USD prices - Claude 3 Haiku, Titan Text Embeddings V2 and Comprehend sentiment
+DEFAULT_PRICES = {
+    'input_per_1k_tokens': 0.00025,
+    'output_per_1k_tokens': 0.00125,
+    'embedding_per_1k_tokens': 0.00002,
+    'comprehend_per_unit': 0.0001,
+}
+
+
+def file_name_from_key(key):
+    #transcripts/<file_name>.txt - file_name is the DynamoDB partition key
+    return key.split('/')[-1].split('.')[0].split('_')[0]
+
+
+def list_transcripts(s3_client, bucket, prefix=SOURCE_PREFIX):
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix + '/'):
+        for item in page.get('Contents', []):
+            if item['Key'].endswith('.txt'):
+                yield {'key': item['Key'], 'size': item['Size'], 'last_modified': item['LastModified']}
+
+
+def fetch_items(dynamodb_client, table, file_names):
+    """Look up upload rows with BatchGetItem, 100 keys at a time. Returns {file_name: item}."""
+    items = {}
+    file_names = list(dict.fromkeys(file_names))
+    for start in range(0, len(file_names), 100):
+        request = {table: {'Keys': [{'file_name': {'S': name}} for name in file_names[start:start + 100]],
+                           'ProjectionExpression': 'file_name, file_owner, file_timestamp'}}
+        while request:
+            response = dynamodb_client.batch_get_item(RequestItems=request)
+            for item in response['Responses'].get(table, []):
+                items[item['file_name']['S']] = item
+            request = response.get('UnprocessedKeys') or None
+            if request:
+                time.sleep(0.1)
+    return items
+
+
+def filter_transcripts(transcripts, dynamodb_client=None, table=None, owner=None, since=None, until=None):
+    """Keep transcripts uploaded by `owner` between `since` and `until` (datetimes, UTC)."""
+    if owner is None and since is None and until is None:
+        return list(transcripts)
+
+    transcripts = list(transcripts)
+    items = fetch_items(dynamodb_client, table, [file_name_from_key(t['key']) for t in transcripts])
+    selected = []
+    for transcript in transcripts:
+        item = items.get(file_name_from_key(transcript['key']))
+        if item is None:
+            continue
+        if owner is not None and item['file_owner']['S'] != owner:
+            continue
+        uploaded = datetime.datetime.fromtimestamp(int(item['file_timestamp']['S']), tz=datetime.timezone.utc)
+        if since is not None and uploaded < since:
+            continue
+        if until is not None and uploaded >= until:
+            continue
+        selected.append(transcript)
+    return selected
+
+
+def estimate_cost(transcripts, prices=DEFAULT_PRICES):
+    """Rough cost of re-running the pipeline, from the transcript object sizes alone."""
+    text_chars = sum(t['size'] for t in transcripts) * TEXT_CHARS_PER_JSON_BYTE
+    chunks = sum(max(1, int(t['size'] * TEXT_CHARS_PER_JSON_BYTE / (CHUNK_CHARS - CHUNK_OVERLAP))) for t in transcripts)
+    chunk_tokens = chunks * CHUNK_CHARS / CHARS_PER_TOKEN
+
+    input_tokens = chunk_tokens + chunks * MAP_OUTPUT_TOKENS
+    output_tokens = chunks * MAP_OUTPUT_TOKENS + len(transcripts) * REDUCE_OUTPUT_TOKENS
+    estimate = {
+        'transcripts': len(transcripts),
+        'input_tokens': int(input_tokens),
+        'output_tokens': int(output_tokens),
+        'embedding_tokens': int(chunk_tokens),
+        'comprehend_units': int(text_chars / COMPREHEND_UNIT_CHARS),
+    }
+    estimate['usd'] = round(
+        input_tokens / 1000 * prices['input_per_1k_tokens']
+        + output_tokens / 1000 * prices['output_per_1k_tokens']
+        + chunk_tokens / 1000 * prices['embedding_per_1k_tokens']
+        + estimate['comprehend_units'] * prices['comprehend_per_unit'], 4)
+    return estimate
+
+
+class RateLimiter:
+    """Token bucket shared by the worker threads - at most `rate` invocations per second on average."""
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+class Checkpoint:
+    """Append only JSON lines file of finished keys, so a run can be resumed."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        if record['status'] == 'done':
+                            self.done.add(record['key'])
+
+    def record(self, key, status, **fields):
+        if status == 'done':
+            self.done.add(key)
+        if not self.path:
+            return
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(dict(key=key, status=status, **fields)) + '\n')
+
+
+def s3_event(bucket, key):
+    #the shape generate_compiled reads from an S3 notification - marked so it doesn't email the owner again
+    return {
+        'backfill': True,
+        'Records': [{
+            'eventSource': 'aws:s3',
+            's3': {'bucket': {'name': bucket}, 'object': {'key': key}},
+        }]
+    }
+
+
+def invoke_compiled(lambda_client, function_name, bucket, key, rate_limiter, sleep=time.sleep):
+    """Invoke the pipeline for one transcript, retrying throttling with exponential backoff."""
+    for attempt in range(MAX_ATTEMPTS):
+        rate_limiter.acquire()
+        try:
+            response = lambda_client.invoke(
+                FunctionName=function_name,
+                InvocationType='RequestResponse',
+                Payload=json.dumps(s3_event(bucket, key)).encode('utf-8')
+            )
+        except Exception as e:
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+            if code in THROTTLING_ERRORS and attempt < MAX_ATTEMPTS - 1:
+                sleep(min(30, 2 ** attempt))
+                continue
+            raise
+        payload = response['Payload'].read().decode('utf-8', errors='replace')
+        if response.get('FunctionError'):
+            raise RuntimeError('{}: {}'.format(response['FunctionError'], payload[:500]))
+        #an extractive fallback isn't a refreshed summary - fail it so a resumed run retries it
+        summary_source = (json.loads(payload or '{}').get('body') or {}).get('summary_source')
+        if summary_source != 'bedrock':
+            raise RuntimeError('summary not generated by Bedrock (summary_source {})'.format(summary_source))
+        return attempt + 1
+
+
+def run_backfill(lambda_client, function_name, bucket, transcripts, checkpoint, concurrency=4, rate=None,
+                 progress=print, clock=time.monotonic, sleep=time.sleep):
+    """Process transcripts with at most `concurrency` invocations in flight. Returns a throughput report."""
+    pending = [t for t in transcripts if t['key'] not in checkpoint.done]
+    rate_limiter = RateLimiter(rate, burst=max(1, concurrency), clock=clock, sleep=sleep)
+    report = {'total': len(transcripts), 'skipped': len(transcripts) - len(pending), 'done': 0, 'failed': 0}
+    started = clock()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        queue = iter(pending)
+        in_flight = {}
+        while True:
+            #keep the number of queued invocations bounded, whatever the size of the corpus
+            while len(in_flight) < concurrency:
+                transcript = next(queue, None)
+                if transcript is None:
+                    break
+                future = executor.submit(invoke_compiled, lambda_client, function_name, bucket, transcript['key'], rate_limiter, sleep)
+                in_flight[future] = transcript
+            if not in_flight:
+                break
+            finished, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                transcript = in_flight.pop(future)
+                try:
+                    attempts = future.result()
+                except Exception as e:
+                    report['failed'] += 1
+                    checkpoint.record(transcript['key'], 'failed', error=str(e)[:500])
+                    progress('failed {}: {}'.format(transcript['key'], e))
+                else:
+                    report['done'] += 1
+                    checkpoint.record(transcript['key'], 'done', attempts=attempts)
+                completed = report['done'] + report['failed']
+                if completed % 10 == 0 or completed == len(pending):
+                    elapsed = clock() - started
+                    progress('{}/{} processed, {:.2f}/s'.format(completed, len(pending), completed / elapsed if elapsed else 0.0))
+
+    report['elapsed_seconds'] = round(clock() - started, 3)
+    processed = report['done'] + report['failed']
+    report['per_second'] = round(processed / report['elapsed_seconds'], 3) if report['elapsed_seconds'] else None
+    return report
+
+
+def parse_date(value):
+    return datetime.datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--bucket', required=True, help='application bucket name')
+    parser.add_argument('--function-name', help='generate_compiled Lambda name (GenerateCompiledFunctionName stack output)')
+    parser.add_argument('--table', help='upload DynamoDB table name, needed for --owner/--since/--until')
+    parser.add_argument('--owner', help='only transcripts uploaded by this email address')
+    parser.add_argument('--since', type=parse_date, help='only uploads on or after this date (YYYY-MM-DD, UTC)')
+    parser.add_argument('--until', type=parse_date, help='only uploads before this date (YYYY-MM-DD, UTC)')
+    parser.add_argument('--concurrency', type=int, default=4, help='invocations in flight (default 4)')
+    parser.add_argument('--rate', type=float, default=1.0, help='maximum invocations per second (default 1)')
+    parser.add_argument('--run-id', help='resume this run (default: a new run id from the current time)')
+    parser.add_argument('--checkpoint', help='progress file (default: backfill_checkpoint_<run id>.jsonl)')
+    parser.add_argument('--dry-run', action='store_true', help='list and estimate cost without invoking anything')
+    args = parser.parse_args(argv)
+
+    if (args.owner or args.since or args.until) and not args.table:
+        parser.error('--table is required to filter by owner or date')
+    if not args.dry_run and not args.function_name:
+        parser.error('--function-name is required unless --dry-run is set')
+
+    import boto3
+    from botocore.config import Config
+
+    transcripts = list_transcripts(boto3.client('s3'), args.bucket)
+    transcripts = filter_transcripts(transcripts, boto3.client('dynamodb') if args.table else None, args.table,
+                                     owner=args.owner, since=args.since, until=args.until)
+    #each run has its own checkpoint, so a backfill after the next model or prompt change starts from scratch
+    run_id = args.run_id or datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    checkpoint = Checkpoint(args.checkpoint or 'backfill_checkpoint_{}.jsonl'.format(run_id))
+    if not args.dry_run:
+        print('run id {} - pass --run-id {} to resume'.format(run_id, run_id))
+    remaining = [t for t in transcripts if t['key'] not in checkpoint.done]
+
+    if args.dry_run:
+        for transcript in remaining:
+            print(transcript['key'])
+        print(json.dumps(estimate_cost(remaining), indent=2))
+        return 0
+
+    #the pipeline can run for several minutes - wait for it rather than letting botocore retry the invoke
+    lambda_client = boto3.client('lambda', config=Config(read_timeout=900, retries={'max_attempts': 0}))
+    report = run_backfill(lambda_client, args.function_name, args.bucket, transcripts, checkpoint,
+                          concurrency=args.concurrency, rate=args.rate)
+    print(json.dumps(report, indent=2))
+    return 1 if report['failed'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,98 @@
+import importlib.util
+import io
+import json
+import os
+import sys
+import types
+from types import SimpleNamespace
+
+import pytest
+
+#make the Lambda function modules importable from the tests
+LAMBDA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'lambda'))
+sys.path.insert(0, os.path.join(LAMBDA_DIR, 'generate_compiled'))
+sys.path.insert(0, os.path.join(LAMBDA_DIR, 'common_layer', 'python'))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'scripts')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'benchmarks')))
+
+
+@pytest.fixture
+def load_handler(monkeypatch):
+    """Import lambda/<name>/index.py as its own module, with the environment the stack would set."""
+    def load(name, environment=None):
+        monkeypatch.setenv('AWS_DEFAULT_REGION', 'eu-west-1')
+        for key, value in (environment or {}).items():
+            monkeypatch.setenv(key, value)
+        monkeypatch.syspath_prepend(os.path.join(LAMBDA_DIR, name))
+        spec = importlib.util.spec_from_file_location('{}_index'.format(name), os.path.join(LAMBDA_DIR, name, 'index.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    return load
+
+
+def langchain_stubs(summarise):
+    """Minimal stand-ins for the langchain modules generate_compiled imports, which aren't installed for the tests."""
+    class TextSplitter:
+        def __init__(self, chunk_size=1000, chunk_overlap=0, add_start_index=False, **kwargs):
+            self.chunk_size = chunk_size
+
+        def create_documents(self, texts):
+            text = texts[0]
+            return [SimpleNamespace(page_content=text[start:start + self.chunk_size], metadata={'start_index': start})
+                    for start in range(0, len(text), self.chunk_size)]
+
+    class Chain:
+        def invoke(self, docs, return_only_outputs=True):
+            return {'output_text': summarise(docs)}
+
+    modules = {name: types.ModuleType(name) for name in (
+        'langchain', 'langchain.prompts', 'langchain.docstore', 'langchain.docstore.document', 'langchain.chains',
+        'langchain.chains.summarize', 'langchain_aws', 'langchain_text_splitters')}
+    modules['langchain.prompts'].PromptTemplate = lambda **kwargs: SimpleNamespace(**kwargs)
+    modules['langchain.docstore.document'].Document = SimpleNamespace
+    modules['langchain.chains.summarize'].load_summarize_chain = lambda **kwargs: Chain()
+    modules['langchain_aws'].ChatBedrock = lambda **kwargs: SimpleNamespace(**kwargs)
+    modules['langchain_text_splitters'].RecursiveCharacterTextSplitter = TextSplitter
+    return modules
+
+
+@pytest.fixture
+def compiled_handler(load_handler, monkeypatch):
+    """Load generate_compiled with stub S3, DynamoDB, Comprehend, SES and Bedrock (via langchain) clients.
+
+    Returns (module, stubs); stubs.objects holds what was written to S3 and stubs.updates the DynamoDB updates.
+    """
+    def load(contents, summarise=lambda docs: 'The team agreed the budget.'):
+        for name, module in langchain_stubs(summarise).items():
+            monkeypatch.setitem(sys.modules, name, module)
+        module = load_handler('generate_compiled', {
+            'APPLICATION_BUCKET': 'bucket', 'NOTES_PREFIX': 'notes', 'COMPILED_PREFIX': 'compiled',
+            'TRANSLATIONS_PREFIX': 'translations', 'EMBEDDINGS_PREFIX': 'embeddings', 'DYNAMODB_TABLE_NAME': 'uploads',
+            'BEDROCK_MODEL_ID': 'model', 'SES_SEND_EMAIL': 'true', 'SES_SENDER_FROM': 'notes@example.com', 'EMBEDDER': 'hashing'})
+
+        stubs = SimpleNamespace(objects={'transcripts/abc.txt': json.dumps(contents).encode('utf-8')}, updates=[], emails=[])
+
+        def put_object(Bucket, Key, Body, **kwargs):
+            stubs.objects[Key] = Body
+
+        def batch_detect_sentiment(TextList, LanguageCode):
+            score = {'Positive': 0.7, 'Negative': 0.1, 'Neutral': 0.15, 'Mixed': 0.05}
+            return {'ResultList': [{'Index': i, 'Sentiment': 'POSITIVE', 'SentimentScore': score} for i in range(len(TextList))],
+                    'ErrorList': []}
+
+        def update_item(**kwargs):
+            stubs.updates.append(kwargs)
+            return {'Attributes': kwargs['ExpressionAttributeValues']}
+
+        item = {'file_name': {'S': 'abc'}, 'file_owner': {'S': 'user@example.com'}}
+        monkeypatch.setattr(module, 's3_client', SimpleNamespace(
+            put_object=put_object, get_object=lambda Bucket, Key: {'Body': io.BytesIO(stubs.objects[Key])}))
+        monkeypatch.setattr(module, 'dynamo_table', SimpleNamespace(update_item=update_item))
+        monkeypatch.setattr(module, 'dynamodb_client', SimpleNamespace(get_item=lambda **kwargs: {'Item': item}))
+        monkeypatch.setattr(module, 'comprehend_client', SimpleNamespace(batch_detect_sentiment=batch_detect_sentiment))
+        monkeypatch.setattr(module, 'ses_client', SimpleNamespace(
+            send_email=lambda **kwargs: stubs.emails.append(kwargs) or {'MessageId': 'message-1'}))
+        return module, stubs
+    return load
+
@@ -0,0 +1,65 @@
+import gzip
+import io
+
+import pytest
+
+import artifact_store
+
+
+class StubS3:
+    """In-memory stand-in for the S3 client put_object/get_object calls."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, ContentType=None, ContentEncoding=None):
+        self.objects[(Bucket, Key)] = {'Body': Body, 'ContentType': ContentType, 'ContentEncoding': ContentEncoding}
+
+    def get_object(self, Bucket, Key):
+        stored = self.objects[(Bucket, Key)]
+        response = {'Body': io.BytesIO(stored['Body']), 'ContentType': stored['ContentType']}
+        if stored['ContentEncoding']:
+            response['ContentEncoding'] = stored['ContentEncoding']
+        return response
+
+
+def test_put_and_get_round_trip_gzip():
+    s3 = StubS3()
+    text = 'spk_0 - we agreed to ship the release on friday. ' * 500
+
+    stored_bytes = artifact_store.put_artifact(s3, 'bucket', 'compiled/a.txt', text, encoding='gzip')
+
+    assert s3.objects[('bucket', 'compiled/a.txt')]['ContentEncoding'] == 'gzip'
+    assert stored_bytes < len(text) / 5
+    assert artifact_store.get_artifact_text(s3, 'bucket', 'compiled/a.txt') == text
+
+
+def test_identity_has_no_content_encoding():
+    s3 = StubS3()
+    artifact_store.put_artifact(s3, 'bucket', 'notes/a.txt', b'{}', encoding='identity')
+
+    assert s3.objects[('bucket', 'notes/a.txt')]['ContentEncoding'] is None
+    assert artifact_store.get_artifact(s3, 'bucket', 'notes/a.txt') == b'{}'
+
+
+def test_reads_uncompressed_and_unlabelled_gzip_objects():
+    s3 = StubS3()
+    s3.put_object(Bucket='bucket', Key='transcripts/plain.txt', Body=b'{"results": {}}')
+    s3.put_object(Bucket='bucket', Key='transcripts/gz.txt', Body=gzip.compress(b'{"results": {}}'))
+
+    assert artifact_store.get_artifact(s3, 'bucket', 'transcripts/plain.txt') == b'{"results": {}}'
+    assert artifact_store.get_artifact(s3, 'bucket', 'transcripts/gz.txt') == b'{"results": {}}'
+
+
+def test_zstd_round_trip_or_gzip_fallback():
+    body, encoding = artifact_store.compress(b'hello ' * 100, 'zstd')
+    if artifact_store.zstandard is None:
+        assert encoding == 'gzip'
+    else:
+        assert encoding == 'zstd'
+    assert artifact_store.decompress(body, encoding) == b'hello ' * 100
+
+
+def test_unknown_encoding_rejected():
+    with pytest.raises(ValueError):
+        artifact_store.compress(b'x', 'brotli')
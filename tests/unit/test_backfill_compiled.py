@@ -0,0 +1,160 @@
+import datetime
+import io
+import json
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import backfill_compiled
+
+
+class StubS3:
+    def __init__(self, keys):
+        self.keys = keys
+
+    def get_paginator(self, name):
+        assert name == 'list_objects_v2'
+        keys = self.keys
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                #two pages, like a real listing of a large prefix
+                contents = [{'Key': key, 'Size': 100000, 'LastModified': None} for key in keys if key.startswith(Prefix)]
+                yield {'Contents': contents[:2]}
+                yield {'Contents': contents[2:]}
+        return Paginator()
+
+
+class StubDynamoDB:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def batch_get_item(self, RequestItems):
+        (table, request), = RequestItems.items()
+        items = [self.rows[key['file_name']['S']] for key in request['Keys'] if key['file_name']['S'] in self.rows]
+        return {'Responses': {table: items}}
+
+
+class ThrottlingError(Exception):
+    def __init__(self):
+        self.response = {'Error': {'Code': 'TooManyRequestsException'}}
+
+
+class StubLambda:
+    """Records invocations and the peak number in flight; throttles the first call, fails 'bad' keys
+    and falls back to the extractive summary for 'fallback' keys."""
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.keys = []
+        self.throttled = False
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        event = json.loads(Payload)
+        key = event['Records'][0]['s3']['object']['key']
+        assert event['backfill'] is True
+        with self.lock:
+            if not self.throttled:
+                self.throttled = True
+                raise ThrottlingError()
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+            self.keys.append(key)
+        if 'bad' in key:
+            return {'FunctionError': 'Unhandled', 'Payload': io.BytesIO(b'{"errorMessage": "boom"}')}
+        summary_source = 'extractive' if 'fallback' in key else 'bedrock'
+        body = {'statusCode': 200, 'body': {'message': '"Completed"', 'summary_source': summary_source}}
+        return {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(body).encode('utf-8'))}
+
+
+def row(name, owner, day):
+    timestamp = int(datetime.datetime(2024, 1, day, tzinfo=datetime.timezone.utc).timestamp())
+    return {'file_name': {'S': name}, 'file_owner': {'S': owner}, 'file_timestamp': {'S': str(timestamp)}}
+
+
+def test_list_and_filter_by_owner_and_date():
+    s3 = StubS3(['transcripts/a.txt', 'transcripts/b.txt', 'transcripts/c.txt', 'transcripts/.write_access_check_file.temp', 'notes/a.txt'])
+    dynamodb = StubDynamoDB({'a': row('a', 'ann@example.com', 1), 'b': row('b', 'bob@example.com', 5), 'c': row('c', 'ann@example.com', 10)})
+
+    transcripts = list(backfill_compiled.list_transcripts(s3, 'bucket'))
+    assert [t['key'] for t in transcripts] == ['transcripts/a.txt', 'transcripts/b.txt', 'transcripts/c.txt']
+
+    selected = backfill_compiled.filter_transcripts(
+        transcripts, dynamodb, 'uploads', owner='ann@example.com',
+        since=datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc))
+    assert [t['key'] for t in selected] == ['transcripts/c.txt']
+
+
+def test_run_backfill_bounded_concurrency_and_resume(tmp_path):
+    transcripts = [{'key': 'transcripts/{}.txt'.format(i), 'size': 1000} for i in range(12)]
+    transcripts.append({'key': 'transcripts/bad.txt', 'size': 1000})
+    transcripts.append({'key': 'transcripts/fallback.txt', 'size': 1000})
+    checkpoint_path = str(tmp_path / 'checkpoint.jsonl')
+    stub = StubLambda()
+
+    report = backfill_compiled.run_backfill(stub, 'generate-compiled', 'bucket', transcripts,
+                                            backfill_compiled.Checkpoint(checkpoint_path), concurrency=3,
+                                            progress=lambda message: None, sleep=lambda seconds: None)
+
+    assert report['done'] == 12
+    assert report['failed'] == 2
+    assert report['per_second'] > 0
+    assert stub.peak <= 3
+    assert sorted(stub.keys) == sorted(t['key'] for t in transcripts)
+
+    #a second run only retries what failed
+    resumed = StubLambda()
+    resumed.throttled = True
+    report = backfill_compiled.run_backfill(resumed, 'generate-compiled', 'bucket', transcripts,
+                                            backfill_compiled.Checkpoint(checkpoint_path), concurrency=3,
+                                            progress=lambda message: None)
+    assert report['skipped'] == 12
+    assert sorted(resumed.keys) == ['transcripts/bad.txt', 'transcripts/fallback.txt']
+
+
+def test_rate_limiter_spaces_invocations():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    limiter = backfill_compiled.RateLimiter(rate=2, burst=1, clock=lambda: now[0], sleep=sleep)
+    for _ in range(5):
+        limiter.acquire()
+
+    #one token up front, then one every half second
+    assert now[0] == 2.0
+
+
+def test_dry_run_estimate():
+    hour_long = {'key': 'transcripts/a.txt', 'size': 1200000}
+    estimate = backfill_compiled.estimate_cost([hour_long, hour_long])
+
+    assert estimate['transcripts'] == 2
+    assert estimate['input_tokens'] > estimate['output_tokens'] > 0
+    assert 0 < estimate['usd'] < 1
+
+
+def test_each_run_has_its_own_checkpoint(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    listed = [{'key': 'transcripts/a.txt', 'size': 1000}]
+    monkeypatch.setattr(backfill_compiled, 'list_transcripts', lambda s3, bucket: listed)
+    monkeypatch.setitem(sys.modules, 'boto3', SimpleNamespace(client=lambda *args, **kwargs: None))
+    (tmp_path / 'backfill_checkpoint_first.jsonl').write_text(json.dumps({'key': 'transcripts/a.txt', 'status': 'done'}) + '\n')
+
+    def dry_run(*args):
+        assert backfill_compiled.main(['--bucket', 'bucket', '--dry-run', *args]) == 0
+        return capsys.readouterr().out
+
+    #resuming the first run skips what it finished, a new run lists everything again
+    assert 'transcripts/a.txt' not in dry_run('--run-id', 'first')
+    assert 'transcripts/a.txt' in dry_run()
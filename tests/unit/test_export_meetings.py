@@ -0,0 +1,176 @@
+import gzip
+import io
+import json
+import random
+import threading
+import time
+import zipfile
+from types import SimpleNamespace
+
+import pytest
+from botocore.exceptions import ClientError
+
+MiB = 1024 * 1024
+
+
+class InMemoryS3:
+    """Stand-in for the S3 calls used by the export, tracking concurrent ranged GETs."""
+
+    def __init__(self, objects=None, get_delay=0.005):
+        self.objects = {}
+        self.uploads = {}
+        self.lock = threading.Lock()
+        self.get_delay = get_delay
+        self.gets_in_flight = 0
+        self.peak_gets_in_flight = 0
+        for key, (body, encoding) in (objects or {}).items():
+            self.put_object(Bucket='bucket', Key=key, Body=body, ContentEncoding=encoding)
+
+    def put_object(self, Bucket, Key, Body, ContentEncoding=None, **kwargs):
+        self.objects[Key] = {'Body': bytes(Body), 'ContentEncoding': ContentEncoding}
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadObject')
+        stored = self.objects[Key]
+        head = {'ContentLength': len(stored['Body'])}
+        if stored['ContentEncoding']:
+            head['ContentEncoding'] = stored['ContentEncoding']
+        return head
+
+    def get_object(self, Bucket, Key, Range):
+        with self.lock:
+            self.gets_in_flight += 1
+            self.peak_gets_in_flight = max(self.peak_gets_in_flight, self.gets_in_flight)
+        time.sleep(self.get_delay)
+        start, end = (int(value) for value in Range[len('bytes='):].split('-'))
+        with self.lock:
+            self.gets_in_flight -= 1
+        return {'Body': io.BytesIO(self.objects[Key]['Body'][start:end + 1])}
+
+    def create_multipart_upload(self, Bucket, Key, ContentType):
+        upload_id = 'upload-{}'.format(len(self.uploads))
+        self.uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId][PartNumber] = Body
+        return {'ETag': '"{}"'.format(PartNumber)}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        numbers = [part['PartNumber'] for part in MultipartUpload['Parts']]
+        assert numbers == list(range(1, len(numbers) + 1))
+        #every part but the last must meet the S3 minimum
+        assert all(len(parts[number]) >= 5 * MiB for number in numbers[:-1])
+        self.objects[Key] = {'Body': b''.join(parts[number] for number in numbers), 'ContentEncoding': None}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId)
+
+    def generate_presigned_url(self, method, Params, ExpiresIn):
+        return 'https://example.com/{}?expires={}'.format(Params['Key'], ExpiresIn)
+
+
+@pytest.fixture
+def export_module(load_handler):
+    return load_handler('export_meetings', {
+        'DYNAMODB_TABLE_NAME': 'uploads', 'APPLICATION_BUCKET': 'bucket', 'NOTES_PREFIX': 'notes',
+        'COMPILED_PREFIX': 'compiled', 'TRANSLATIONS_PREFIX': 'translations', 'EXPORTS_PREFIX': 'exports',
+        'EXPORT_WORKER_FUNCTION': 'export-worker'})
+
+
+def test_stream_zip_bounded_memory_and_parallel_fetches(export_module):
+    import zip_export
+
+    rng = random.Random(0)
+    #incompressible content, so the archive spans several parts
+    objects = {'compiled/{}.txt'.format(i): (rng.randbytes(MiB + i * 1000), None) for i in range(12)}
+    text = ('spk_0 - we agreed the budget. ' * 20000).encode('utf-8')
+    objects['notes/gz.txt'] = (gzip.compress(text), 'gzip')
+    s3 = InMemoryS3(objects)
+    members = [{'key': key, 'size': len(body), 'name': key, 'content_encoding': encoding}
+               for key, (body, encoding) in objects.items()]
+
+    report = zip_export.stream_zip(s3, 'bucket', members, 'exports/a.zip',
+                                   part_size=5 * MiB, range_size=256 * 1024, max_in_flight=4)
+
+    assert report['parts'] >= 3
+    assert s3.peak_gets_in_flight > 1
+    assert report['peak_fetch_buffer'] <= 4 * 256 * 1024
+    #one part plus at most one compressed write from the zip member
+    assert report['peak_upload_buffer'] <= 5 * MiB + zip_export.MAX_DECOMPRESSED_CHUNK + 64 * 1024
+
+    with zipfile.ZipFile(io.BytesIO(s3.objects['exports/a.zip']['Body'])) as archive:
+        assert archive.testzip() is None
+        assert archive.read('notes/gz.txt') == text
+        for key, (body, encoding) in objects.items():
+            if encoding is None:
+                assert archive.read(key) == body
+
+
+def test_failed_export_aborts_upload(export_module):
+    import zip_export
+
+    s3 = InMemoryS3({'compiled/a.txt': (b'x' * 100, None)})
+    members = [{'key': 'compiled/a.txt', 'size': 200, 'name': 'a.txt'}, {'key': 'compiled/missing.txt', 'size': 10, 'name': 'b.txt'}]
+
+    with pytest.raises(KeyError):
+        zip_export.stream_zip(s3, 'bucket', members, 'exports/a.zip', part_size=5 * MiB)
+    assert s3.uploads == {}
+    assert 'exports/a.zip' not in s3.objects
+
+
+def test_export_request_worker_and_download_link(export_module, monkeypatch):
+    s3 = InMemoryS3({
+        'compiled/m1.txt': (gzip.compress(b'compiled one'), 'gzip'),
+        'notes/m1.txt': (gzip.compress(b'{"output_text": "notes one"}'), 'gzip'),
+        'compiled/m2.txt': (b'compiled two', None),
+        'compiled/other.txt': (b'not mine', None),
+    })
+    items = [
+        {'file_name': 'm1', 'file_original': 'Team sync.m4a', 'file_timestamp': '1700000000'},
+        {'file_name': 'm2', 'file_original': 'retro.mp3', 'file_timestamp': '1700003600'},
+    ]
+    scans = []
+
+    def scan(**kwargs):
+        #two pages, to check the scan is paginated
+        scans.append(kwargs)
+        if 'ExclusiveStartKey' not in kwargs:
+            return {'Items': items[:1], 'LastEvaluatedKey': {'file_name': 'm1'}}
+        return {'Items': items[1:]}
+
+    invocations = []
+    monkeypatch.setattr(export_module, 's3_client', s3)
+    monkeypatch.setattr(export_module, 'table', SimpleNamespace(scan=scan))
+    monkeypatch.setattr(export_module, 'lambda_client', SimpleNamespace(invoke=lambda **kwargs: invocations.append(kwargs)))
+
+    claims = {'requestContext': {'authorizer': {'claims': {'email': 'user@example.com'}}}}
+    started = export_module.lambda_handler(dict(claims, httpMethod='POST'), None)
+    export_id = json.loads(started['body'])['export_id']
+    assert started['statusCode'] == 202
+    assert invocations[0]['InvocationType'] == 'Event'
+
+    status_event = dict(claims, httpMethod='GET', queryStringParameters={'id': export_id})
+    assert json.loads(export_module.lambda_handler(status_event, None)['body'])['status'] == 'pending'
+
+    report = export_module.export_handler(json.loads(invocations[0]['Payload']), None)
+    assert report['members'] == 3
+    assert len(scans) == 2
+
+    body = json.loads(export_module.lambda_handler(status_event, None)['body'])
+    assert body['status'] == 'ready'
+    assert body['download_url'].startswith('https://example.com/exports/')
+
+    archive_key = export_module.export_key('user@example.com', export_id)
+    with zipfile.ZipFile(io.BytesIO(s3.objects[archive_key]['Body'])) as archive:
+        assert archive.read('Team_sync_m1/compiled.txt') == b'compiled one'
+        assert archive.read('Team_sync_m1/notes.txt') == b'{"output_text": "notes one"}'
+        assert archive.read('retro_m2/compiled.txt') == b'compiled two'
+        assert len(archive.namelist()) == 3
+
+    #another user can't see the export
+    other = {'requestContext': {'authorizer': {'claims': {'email': 'other@example.com'}}},
+             'httpMethod': 'GET', 'queryStringParameters': {'id': export_id}}
+    assert json.loads(export_module.lambda_handler(other, None)['body'])['status'] == 'pending'
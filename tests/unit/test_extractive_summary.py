@@ -0,0 +1,83 @@
+import random
+import re
+import time
+
+import numpy as np
+
+import extractive_summary
+
+TOPICS = [
+    "the budget for the marketing campaign needs approval from finance before the launch",
+    "the release of the mobile application is planned for the end of the quarter",
+    "customer support tickets about billing errors have doubled since the migration",
+]
+
+
+def transcribed(text):
+    """Text as generate_compiled builds turns - every Transcribe item, punctuation included, joined by spaces."""
+    return ' '.join(re.findall(r"[\w']+|[.,!?]", text))
+
+
+def synthetic_turns(sentences=900, seed=0):
+    """Sentences mostly about the budget, with some release and billing discussion and filler."""
+    rng = random.Random(seed)
+    turns = []
+    for index in range(sentences):
+        topic = rng.choices(TOPICS, weights=[6, 3, 1])[0].split()
+        rng.shuffle(topic)
+        turns.append(('spk_{}'.format(index % 3), transcribed(' '.join(topic) + '. Okay.')))
+    return turns
+
+
+def test_summary_is_within_budget_and_from_transcript():
+    turns = synthetic_turns(200)
+    summary = extractive_summary.summarise(turns, max_words=60)
+
+    lines = summary.split('\n')
+    assert lines
+    assert sum(len(line.split(' - ', 1)[1].split()) for line in lines) <= 60
+    sentences = {sentence for _, sentence in extractive_summary.split_sentences(turns)}
+    assert all(line.split(' - ', 1)[1] in sentences for line in lines)
+
+
+def test_central_sentence_ranks_first():
+    hub = "The finance budget approval decides the mobile release date and the billing migration plan."
+    turns = [('spk_0', transcribed(sentence)) for sentence in [
+        "Finance wants the budget approval signed off this week.",
+        "The budget approval from finance is still pending.",
+        "The mobile release date moved to the end of the quarter.",
+        "Testing for the mobile release date looks fine so far.",
+        "The billing migration plan caused more support tickets.",
+        "Support expects the billing migration plan to settle soon.",
+    ]]
+    turns.insert(3, ('spk_1', transcribed(hub)))
+
+    summary = extractive_summary.summarise(turns, max_words=15)
+    assert summary == 'spk_1 - ' + hub
+
+
+def test_punctuation_attached_to_previous_word():
+    turns = [('spk_0', transcribed("So, the release is late. Can finance approve the budget today?"))]
+    assert turns[0][1].startswith('So , the release is late .')
+
+    sentences = [sentence for _, sentence in extractive_summary.split_sentences(turns)]
+    assert sentences == ['So, the release is late.', 'Can finance approve the budget today?']
+
+
+def test_textrank_scores_sum_to_one():
+    matrix = extractive_summary.tfidf_matrix([sentence for _, sentence in extractive_summary.split_sentences(synthetic_turns(50))])
+    scores = extractive_summary.textrank(matrix @ matrix.T)
+    assert np.isclose(scores.sum(), 1.0, atol=1e-3)
+
+
+def test_empty_and_filler_only_meetings():
+    assert extractive_summary.summarise([]) == ''
+    assert extractive_summary.summarise([('spk_0', transcribed('Yeah. Okay, thanks.'))]) == ''
+
+
+def test_hour_long_meeting_is_fast():
+    #about 150 words a minute for an hour
+    turns = synthetic_turns(900)
+    started = time.perf_counter()
+    extractive_summary.summarise(turns)
+    assert time.perf_counter() - started < 1.0
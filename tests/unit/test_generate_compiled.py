@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import artifact_store
+from synthetic_meeting import synthetic_transcript
+
+
+def transcript_event(**fields):
+    return dict({'Records': [{'eventSource': 'aws:s3', 's3': {'bucket': {'name': 'bucket'}, 'object': {'key': 'transcripts/abc.txt'}}}]}, **fields)
+
+
+def throttled(docs):
+    raise RuntimeError('ThrottlingException: Too many requests')
+
+
+def test_bedrock_summary_replaces_draft(compiled_handler):
+    module, stubs = compiled_handler(synthetic_transcript(minutes=5))
+
+    response = module.lambda_handler(transcript_event(), None)
+
+    assert response['body']['summary_source'] == 'bedrock'
+    assert stubs.updates[0]['ExpressionAttributeValues'][':s'] == 'draft'
+    assert stubs.updates[-1]['ExpressionAttributeValues'][':u'] == 'bedrock'
+    assert 'The team agreed the budget.' in stubs.updates[-1]['ExpressionAttributeValues'][':r']
+    assert len(stubs.emails) == 1
+
+
+def test_bedrock_failure_falls_back_to_draft(compiled_handler):
+    module, stubs = compiled_handler(synthetic_transcript(minutes=5), summarise=throttled)
+
+    response = module.lambda_handler(transcript_event(), None)
+
+    assert response['body']['summary_source'] == 'extractive'
+    assert ' .' not in stubs.updates[0]['ExpressionAttributeValues'][':d']
+    assert json.loads(artifact_store.decompress(stubs.objects['notes/abc.txt']))['output_text'] == stubs.updates[0]['ExpressionAttributeValues'][':d']
+
+
+def test_backfill_keeps_existing_summary_when_bedrock_fails(compiled_handler):
+    module, stubs = compiled_handler(synthetic_transcript(minutes=5), summarise=throttled)
+
+    with pytest.raises(RuntimeError):
+        module.lambda_handler(transcript_event(backfill=True), None)
+
+    #no draft written over the finished summary, and no notes replaced
+    assert stubs.updates == []
+    assert 'notes/abc.txt' not in stubs.objects
+
+
+def test_backfill_refreshes_summary_without_email(compiled_handler):
+    module, stubs = compiled_handler(synthetic_transcript(minutes=5))
+
+    response = module.lambda_handler(transcript_event(backfill=True), None)
+
+    assert response['body']['summary_source'] == 'bedrock'
+    assert len(stubs.updates) == 1
+    assert stubs.emails == []
@@ -0,0 +1,67 @@
+import json
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+
+from boto3.dynamodb.conditions import ConditionExpressionBuilder
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from synthetic_meeting import synthetic_transcript
+
+
+def api_event(email='user@example.com'):
+    return {'requestContext': {'authorizer': {'claims': {'email': email}}}}
+
+
+def round_trip(item):
+    #what the dynamodb resource writes and then returns from a scan - numbers come back as Decimal
+    serializer = TypeSerializer()
+    deserializer = TypeDeserializer()
+    return {key: deserializer.deserialize(serializer.serialize(value)) for key, value in item.items()}
+
+
+def test_list_uploads_serialises_processed_meeting(load_handler, compiled_handler, monkeypatch):
+    #the attributes generate_compiled writes for a processed meeting
+    compiled, stubs = compiled_handler(synthetic_transcript(minutes=5))
+    compiled.lambda_handler({'Records': [{'s3': {'object': {'key': 'transcripts/abc.txt'}}}]}, None)
+    written = stubs.updates[-1]['ExpressionAttributeValues']
+    item = round_trip({
+        'file_name': 'abc',
+        'file_owner': 'user@example.com',
+        'file_timestamp': '1700000000',
+        'combined_summary': written[':r'],
+        'speaker_sentiment': written[':s'],
+        'turn_sentiment': written[':t'],
+        'summary_source': written[':u'],
+    })
+    speaker_label, stored = next(iter(item['speaker_sentiment'].items()))
+    assert isinstance(stored['turns'], Decimal)
+
+    module = load_handler('list_uploads', {'DYNAMODB_TABLE_NAME': 'uploads'})
+    monkeypatch.setattr(module, 'table', SimpleNamespace(scan=lambda **kwargs: {'Items': [item]}))
+
+    response = module.lambda_handler(api_event(), None)
+
+    assert response['statusCode'] == 200
+    listed = json.loads(response['body'])[0]
+    assert listed['summary_source'] == 'bedrock'
+    speaker = listed['speaker_sentiment'][speaker_label]
+    assert speaker['turns'] == int(stored['turns'])
+    assert speaker['scores'] == {label: float(score) for label, score in stored['scores'].items()}
+    assert set(speaker['scores']) == {'POSITIVE', 'NEGATIVE', 'NEUTRAL', 'MIXED'}
+
+
+def test_list_uploads_hides_expired_pending_rows(load_handler, monkeypatch):
+    module = load_handler('list_uploads', {'DYNAMODB_TABLE_NAME': 'uploads'})
+    scans = []
+    monkeypatch.setattr(module, 'table', SimpleNamespace(scan=lambda **kwargs: scans.append(kwargs) or {'Items': []}))
+
+    module.lambda_handler(api_event(), None)
+
+    expression = ConditionExpressionBuilder().build_expression(scans[0]['FilterExpression'])
+    condition = expression.condition_expression
+    for placeholder, name in expression.attribute_name_placeholders.items():
+        condition = condition.replace(placeholder, name)
+    assert condition == '(file_owner = :v0 AND (attribute_not_exists(expires_at) OR expires_at > :v1))'
+    assert expression.attribute_value_placeholders[':v0'] == 'user@example.com'
+    assert abs(expression.attribute_value_placeholders[':v1'] - time.time()) < 60
@@ -0,0 +1,117 @@
+import io
+import json
+import mmap
+from types import SimpleNamespace
+
+import numpy as np
+
+import meeting_index
+
+TRANSCRIPT = (
+    "Good morning everyone, let's start with the budget. The budget for next quarter is forty thousand euros. "
+    "Next, the release date. We agreed the release goes out on the twelfth of March. "
+    "Finally hiring: we will hire two engineers for the café team in Zürich. "
+    "Any other business? None, thanks everyone."
+)
+
+
+def sentence_offsets(text):
+    offsets = []
+    start = 0
+    for sentence in text.split('. '):
+        offsets.append((start, start + len(sentence)))
+        start += len(sentence) + 2
+    return offsets
+
+
+def test_hashing_embedder_is_deterministic():
+    embedder = meeting_index.HashingEmbedder(dimensions=64)
+    first = embedder.embed(['release date in March'])
+    second = meeting_index.HashingEmbedder(dimensions=64).embed(['release date in March'])
+    assert first.dtype == np.float32
+    assert np.array_equal(first, second)
+
+
+def test_index_round_trip_is_zero_copy():
+    embedder = meeting_index.HashingEmbedder()
+    offsets = sentence_offsets(TRANSCRIPT)
+    index_bytes = meeting_index.build_index(embedder, TRANSCRIPT, offsets)
+
+    index = meeting_index.MeetingIndex(index_bytes)
+
+    assert index.matrix.shape == (len(offsets), embedder.dimensions)
+    assert index.matrix.base is not None and not index.matrix.flags.owndata
+    assert np.allclose(np.linalg.norm(index.matrix, axis=1), 1.0)
+    #offsets are UTF-8 byte offsets, so chunks after non ASCII text still line up
+    for chunk_index, (start, end) in enumerate(offsets):
+        assert index.chunk(chunk_index) == TRANSCRIPT[start:end]
+
+
+def test_search_matches_brute_force(tmp_path):
+    embedder = meeting_index.HashingEmbedder()
+    offsets = sentence_offsets(TRANSCRIPT)
+    index_path = tmp_path / 'meeting.idx'
+    index_path.write_bytes(meeting_index.build_index(embedder, TRANSCRIPT, offsets))
+
+    with open(index_path, 'rb') as f:
+        index = meeting_index.MeetingIndex(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    query = embedder.embed(['when is the release date'])[0]
+    matches = index.search(query, k=2)
+
+    expected = np.argsort(-(index.matrix @ (query / np.linalg.norm(query))))[:2]
+    assert [chunk_index for chunk_index, _ in matches] == list(expected)
+    assert 'release' in index.chunk(matches[0][0])
+    assert matches[0][1] >= matches[1][1]
+
+    index_map = index.buffer
+    index.close()
+    assert index_map.closed
+
+
+def test_empty_index():
+    index = meeting_index.MeetingIndex(meeting_index.build_index(meeting_index.HashingEmbedder(), '', []))
+    assert index.search(np.ones(meeting_index.DEFAULT_DIMENSIONS), k=3) == []
+
+
+def test_ask_handler_sends_only_top_chunks(load_handler, monkeypatch, tmp_path):
+    module = load_handler('ask_meeting', {'DYNAMODB_TABLE_NAME': 'uploads', 'EMBEDDINGS_PREFIX': 'embeddings', 'ASK_TOP_K': '1'})
+    monkeypatch.setattr(module, 'INDEX_PATH', str(tmp_path / 'meeting.idx'))
+    closed = []
+    close = meeting_index.MeetingIndex.close
+    monkeypatch.setattr(meeting_index.MeetingIndex, 'close', lambda self: closed.append(self.buffer) or close(self))
+    index_bytes = meeting_index.build_index(meeting_index.HashingEmbedder(), TRANSCRIPT, sentence_offsets(TRANSCRIPT))
+    prompts = []
+
+    def download_file(Bucket, Key, Filename):
+        assert Key == 'embeddings/meeting-1.idx'
+        with open(Filename, 'wb') as f:
+            f.write(index_bytes)
+
+    def invoke_model(**kwargs):
+        prompts.append(json.loads(kwargs['body'])['messages'][0]['content'])
+        return {'body': io.BytesIO(json.dumps({'content': [{'text': 'The twelfth of March.'}]}).encode('utf-8'))}
+
+    monkeypatch.setattr(module, 's3_client', SimpleNamespace(download_file=download_file))
+    monkeypatch.setattr(module, 'bedrock_runtime', SimpleNamespace(invoke_model=invoke_model))
+    monkeypatch.setattr(module, 'dynamodb_client', SimpleNamespace(
+        get_item=lambda **kwargs: {'Item': {'file_name': {'S': 'meeting-1'}, 'file_owner': {'S': 'user@example.com'}}}))
+
+    event = {
+        'body': json.dumps({'file': 'meeting-1', 'question': 'When does the release go out?'}),
+        'requestContext': {'authorizer': {'claims': {'email': 'user@example.com'}}},
+    }
+    response = module.lambda_handler(event, None)
+    body = json.loads(response['body'])
+
+    assert response['statusCode'] == 200
+    assert body['answer'] == 'The twelfth of March.'
+    assert len(body['sources']) == 1
+    assert 'release' in prompts[0]
+    assert 'budget' not in prompts[0]
+    #the map is closed and the scratch file removed, so a warm container doesn't leak either
+    assert len(closed) == 1 and closed[0].closed
+    assert not (tmp_path / 'meeting.idx').exists()
+
+    event['requestContext']['authorizer']['claims']['email'] = 'someone-else@example.com'
+    assert module.lambda_handler(event, None)['statusCode'] == 404
@@ -13,3 +13,37 @@ def test_sqs_queue_created():
 #     template.has_resource_properties("AWS::SQS::Queue", {
 #         "VisibilityTimeout": 300
 #     })
+
+
+def synth_without_bundling():
+    #skip Docker bundling of the PythonFunction assets so the template can be checked locally
+    app = core.App(context={'aws:cdk:bundling-stacks': []})
+    stack = MeetingNoteGeneratorCdkStack(app, "meeting-note-generator-cdk")
+    return assertions.Template.from_stack(stack)
+
+
+def test_api_response_compression_enabled():
+    template = synth_without_bundling()
+    template.has_resource_properties("AWS::ApiGateway::RestApi", {
+        "MinimumCompressionSize": 1024
+    })
+
+
+def test_pending_upload_rows_expire():
+    template = synth_without_bundling()
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "TimeToLiveSpecification": {"AttributeName": "expires_at", "Enabled": True}
+    })
+
+
+def test_exports_expire_in_versioned_bucket():
+    template = synth_without_bundling()
+    template.has_resource_properties("AWS::S3::Bucket", {
+        "VersioningConfiguration": {"Status": "Enabled"},
+        "LifecycleConfiguration": {"Rules": assertions.Match.array_with([
+            assertions.Match.object_like({
+                "Prefix": "exports/", "ExpirationInDays": 1, "NoncurrentVersionExpiration": {"NoncurrentDays": 1}, "Status": "Enabled"
+            }),
+            assertions.Match.object_like({"Prefix": "exports/", "ExpiredObjectDeleteMarker": True, "Status": "Enabled"}),
+        ])}
+    })
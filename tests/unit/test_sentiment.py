@@ -0,0 +1,72 @@
+import threading
+
+import sentiment
+
+
+class StubComprehend:
+    """Stands in for the Comprehend client - positive if the text contains 'good', otherwise negative."""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def batch_detect_sentiment(self, TextList, LanguageCode):
+        with self.lock:
+            self.calls.append((list(TextList), LanguageCode))
+        results = []
+        for index, text in enumerate(TextList):
+            positive = 0.9 if 'good' in text else 0.1
+            results.append({
+                'Index': index,
+                'Sentiment': 'POSITIVE' if positive > 0.5 else 'NEGATIVE',
+                'SentimentScore': {'Positive': positive, 'Negative': 1 - positive, 'Neutral': 0.0, 'Mixed': 0.0},
+            })
+        return {'ResultList': results, 'ErrorList': []}
+
+
+def test_comprehend_language():
+    assert sentiment.comprehend_language('en-GB') == 'en'
+    assert sentiment.comprehend_language('zh-TW') == 'zh-TW'
+    assert sentiment.comprehend_language('nl-NL') is None
+
+
+def test_split_turn_respects_byte_limit():
+    text = ' '.join(['café'] * 3000)
+    segments = sentiment.split_turn(text, limit=100)
+    assert all(len(segment.encode('utf-8')) <= 100 for segment in segments)
+    assert ' '.join(segments) == text
+
+
+def test_pack_documents_batches_of_25():
+    turns = [('spk_0', 'good day')] * 60
+    batches = sentiment.pack_documents(turns)
+    assert [len(batch) for batch in batches] == [25, 25, 10]
+
+
+def test_analyse_turns_and_aggregate():
+    client = StubComprehend()
+    turns = [('spk_0', 'this is good'), ('spk_1', 'this is bad'), ('spk_0', ''), ('spk_0', 'good again')]
+    turns += [('spk_1', 'not great')] * 30
+
+    turn_results = sentiment.analyse_turns(client, turns, 'en')
+
+    assert len(client.calls) == 2
+    assert all(len(text_list) <= 25 for text_list, _ in client.calls)
+    assert turn_results[0]['sentiment'] == 'POSITIVE'
+    assert turn_results[1]['sentiment'] == 'NEGATIVE'
+    assert turn_results[2] is None
+
+    speakers = sentiment.aggregate_by_speaker(turn_results)
+    assert speakers['spk_0']['sentiment'] == 'POSITIVE'
+    assert speakers['spk_0']['turns'] == 2
+    assert speakers['spk_1']['sentiment'] == 'NEGATIVE'
+    assert speakers['spk_1']['turns'] == 31
+
+
+def test_long_turn_is_weighted_across_segments():
+    client = StubComprehend()
+    long_turn = ' '.join(['good'] * 2000) + ' ' + ' '.join(['bad'] * 100)
+    turn_results = sentiment.analyse_turns(client, [('spk_0', long_turn)], 'en')
+
+    assert len(client.calls[0][0]) > 1
+    assert turn_results[0]['sentiment'] == 'POSITIVE'
@@ -0,0 +1,116 @@
+import io
+import json
+from types import SimpleNamespace
+
+import structured_logger
+from synthetic_meeting import synthetic_transcript
+
+#maximum bytes of log output for one API invocation, whatever the size of the event or response
+API_LOG_BUDGET_BYTES = 1024
+#generate_compiled logs a handful of summary lines, never the transcript, summary or AWS responses
+PIPELINE_LOG_BUDGET_BYTES = 4096
+
+
+def api_event(email='user@example.com', **query):
+    return {
+        'httpMethod': 'GET',
+        'path': '/list_uploads',
+        'headers': {'Authorization': 'secret-token'},
+        'queryStringParameters': query or None,
+        'requestContext': {
+            'requestId': 'request-1',
+            'authorizer': {'claims': {'email': email, 'cognito:username': 'user'}},
+        },
+        'body': 'x' * 100000,
+    }
+
+
+def read_records(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_sanitise_redacts_and_truncates():
+    sanitised = structured_logger.sanitise({
+        'headers': {'Authorization': 'secret-token'},
+        'file_owner': 'user@example.com',
+        'combined_summary': 'word ' * 1000,
+        'items': list(range(100)),
+    }, max_chars=50)
+
+    assert sanitised['headers']['Authorization'] == structured_logger.REDACTED
+    assert sanitised['file_owner'] == structured_logger.REDACTED
+    assert len(sanitised['combined_summary']) < 80
+    assert len(sanitised['items']) == structured_logger.LOG_MAX_ITEMS + 1
+
+
+def test_correlation_id_from_api_gateway_s3_and_context():
+    assert structured_logger.correlation_id(api_event()) == 'request-1'
+    s3_event = {'Records': [{'responseElements': {'x-amz-request-id': 's3-request'}}]}
+    assert structured_logger.correlation_id(s3_event) == 's3-request'
+    assert structured_logger.correlation_id({}, SimpleNamespace(aws_request_id='lambda-request')) == 'lambda-request'
+
+
+def test_debug_is_sampled_per_invocation():
+    stream = io.StringIO()
+    logger = structured_logger.StructuredLogger('test', debug_sample_rate=0.0, stream=stream)
+    logger.start_invocation(api_event())
+    logger.debug('detail', results={'output_text': 'summary'})
+    assert [record['message'] for record in read_records(stream)] == ['invocation start']
+
+    stream = io.StringIO()
+    logger = structured_logger.StructuredLogger('test', debug_sample_rate=1.0, stream=stream)
+    logger.start_invocation(api_event())
+    logger.debug('detail', results={'output_text': 'summary'})
+    records = read_records(stream)
+    assert [record['message'] for record in records] == ['invocation start', 'event', 'detail']
+    assert all(record['correlation_id'] == 'request-1' for record in records)
+    assert 'user@example.com' not in stream.getvalue()
+    assert 'secret-token' not in stream.getvalue()
+
+
+def test_list_uploads_log_volume_within_budget(load_handler, monkeypatch):
+    module = load_handler('list_uploads', {'DYNAMODB_TABLE_NAME': 'uploads'})
+    stream = io.StringIO()
+    monkeypatch.setattr(module.logger, 'stream', stream)
+    monkeypatch.setattr(module.logger, 'debug_sample_rate', 0.0)
+
+    #a user with many long meetings - the scan response is megabytes
+    items = [{'file_name': str(i), 'file_timestamp': str(i), 'combined_summary': 'words ' * 20000} for i in range(50)]
+    monkeypatch.setattr(module, 'table', SimpleNamespace(scan=lambda **kwargs: {'Items': items}))
+
+    response = module.lambda_handler(api_event(), SimpleNamespace(aws_request_id='lambda-request'))
+
+    assert response['statusCode'] == 200
+    assert len(stream.getvalue().encode('utf-8')) <= API_LOG_BUDGET_BYTES
+
+
+def test_get_file_log_volume_within_budget(load_handler, monkeypatch):
+    module = load_handler('get_file_from_s3', {'DYNAMODB_TABLE_NAME': 'uploads'})
+    stream = io.StringIO()
+    monkeypatch.setattr(module.logger, 'stream', stream)
+    monkeypatch.setattr(module.logger, 'debug_sample_rate', 0.0)
+
+    item = {'file_name': {'S': 'abc'}, 'combined_summary': {'S': 'words ' * 50000}}
+    monkeypatch.setattr(module, 'dynamodb_client', SimpleNamespace(get_item=lambda **kwargs: {'Item': item}))
+
+    response = module.lambda_handler(api_event(file='abc'), None)
+
+    assert response['statusCode'] == 200
+    assert len(stream.getvalue().encode('utf-8')) <= API_LOG_BUDGET_BYTES
+
+
+def test_generate_compiled_log_volume_within_budget(compiled_handler, monkeypatch):
+    #a two hour meeting - the transcript, summary, DynamoDB update and email are each hundreds of KB
+    contents = synthetic_transcript(minutes=120)
+    module, stubs = compiled_handler(contents, summarise=lambda docs: 'summary sentence. ' * 2000)
+    stream = io.StringIO()
+    monkeypatch.setattr(module.logger, 'stream', stream)
+    monkeypatch.setattr(module.logger, 'debug_sample_rate', 0.0)
+
+    event = {'Records': [{'eventSource': 'aws:s3', 's3': {'bucket': {'name': 'bucket'}, 'object': {'key': 'transcripts/abc.txt'}}}]}
+    response = module.lambda_handler(event, SimpleNamespace(aws_request_id='lambda-request'))
+
+    assert response['statusCode'] == 200
+    assert len(stubs.emails) == 1
+    assert len(stream.getvalue().encode('utf-8')) <= PIPELINE_LOG_BUDGET_BYTES
+    assert contents['results']['transcripts'][0]['transcript'][:200] not in stream.getvalue()
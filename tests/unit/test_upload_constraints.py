@@ -0,0 +1,196 @@
+import base64
+import io
+import json
+import struct
+from types import SimpleNamespace
+
+import pytest
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+
+def mp3_bytes(frames=1000, xing_frames=None, id3=True):
+    """MPEG-1 Layer III, 128kbps, 44.1kHz stereo - 417 byte frames of 1152 samples."""
+    header = bytes([0xFF, 0xFB, 0x90, 0x00])
+    frame = header + b'\0' * 413
+    data = b''
+    if id3:
+        data += b'ID3\x04\x00\x00' + bytes([0, 0, 0x08, 0x00]) + b'\0' * 1024
+    if xing_frames is not None:
+        #Xing header after the 32 bytes of side info, with the frame count flag set
+        xing = header + b'\0' * 32 + b'Xing' + struct.pack('>II', 1, xing_frames)
+        data += xing + b'\0' * (417 - len(xing))
+    return data + frame * frames
+
+
+def box(box_type, payload):
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def m4a_bytes(duration_seconds=90, timescale=1000, audio_bytes=200000):
+    mvhd = box(b'mvhd', b'\0' * 12 + struct.pack('>II', timescale, duration_seconds * timescale) + b'\0' * 80)
+    #moov after mdat, as written by most recorders without faststart
+    return box(b'ftyp', b'M4A \0\0\0\0isom') + box(b'mdat', b'\0' * audio_bytes) + box(b'moov', mvhd + box(b'trak', b'\0' * 64))
+
+
+def reader(data):
+    return lambda start, length: data[start:start + length]
+
+
+@pytest.fixture
+def media_probe(load_handler):
+    load_handler('generate_transcription', {'DYNAMODB_TABLE_NAME': 'uploads'})
+    import media_probe
+    return media_probe
+
+
+def test_mp3_cbr_duration(media_probe):
+    data = mp3_bytes(frames=1000)
+    duration = media_probe.probe_duration(reader(data), len(data), 'mp3')
+    assert duration == pytest.approx(1000 * 1152 / 44100, rel=0.01)
+
+
+def test_mp3_xing_duration(media_probe):
+    data = mp3_bytes(frames=10, xing_frames=50000)
+    duration = media_probe.probe_duration(reader(data), len(data), 'mp3')
+    assert duration == pytest.approx(50000 * 1152 / 44100)
+
+
+def test_m4a_duration_with_moov_at_end(media_probe):
+    data = m4a_bytes(duration_seconds=90)
+    assert media_probe.probe_duration(reader(data), len(data), 'm4a') == 90
+
+
+@pytest.mark.parametrize('data,file_format', [
+    (m4a_bytes(), 'mp3'),
+    (mp3_bytes(), 'm4a'),
+    (b'<html>not audio</html>' * 100, 'mp3'),
+    (b'', 'm4a'),
+])
+def test_mislabelled_or_corrupt_files_rejected(media_probe, data, file_format):
+    with pytest.raises(media_probe.InvalidMedia):
+        media_probe.probe_duration(reader(data), len(data), file_format)
+
+
+class StubS3:
+    def __init__(self, objects):
+        self.objects = objects
+        self.deleted = []
+        self.gets = 0
+
+    def head_object(self, Bucket, Key):
+        return {'ContentLength': len(self.objects[Key])}
+
+    def get_object(self, Bucket, Key, Range):
+        self.gets += 1
+        start, end = (int(value) for value in Range[len('bytes='):].split('-'))
+        return {'Body': io.BytesIO(self.objects[Key][start:end + 1])}
+
+    def delete_object(self, Bucket, Key):
+        self.deleted.append(Key)
+
+
+def transcription_handler(load_handler, monkeypatch, objects):
+    module = load_handler('generate_transcription', {
+        'DYNAMODB_TABLE_NAME': 'uploads', 'APPLICATION_BUCKET': 'bucket', 'DESTINATION_PREFIX': 'transcripts'})
+    s3 = StubS3(objects)
+    updates = []
+    jobs = []
+    monkeypatch.setattr(module, 's3_client', s3)
+    monkeypatch.setattr(module, 'dynamodb_client', SimpleNamespace(update_item=lambda **kwargs: updates.append(kwargs)))
+    monkeypatch.setattr(module, 'transcribe_client', SimpleNamespace(
+        start_transcription_job=lambda **kwargs: jobs.append(kwargs) or {'TranscriptionJob': {}}))
+    return module, s3, updates, jobs
+
+
+def s3_event(key):
+    return {'Records': [{'eventSource': 'aws:s3', 's3': {'bucket': {'name': 'bucket'}, 'object': {'key': key}}}]}
+
+
+def test_valid_recording_starts_job(load_handler, monkeypatch):
+    module, s3, updates, jobs = transcription_handler(load_handler, monkeypatch, {'recordings/abc.m4a': m4a_bytes()})
+
+    response = module.lambda_handler(s3_event('recordings/abc.m4a'), None)
+
+    assert response['statusCode'] == 200
+    assert len(jobs) == 1
+    assert updates[0]['ExpressionAttributeValues'][':s'] == {'S': 'uploaded'}
+    assert 'remove expires_at' in updates[0]['UpdateExpression']
+    assert updates[0]['ConditionExpression'] == 'attribute_exists(file_name)'
+    assert s3.deleted == []
+
+
+def test_recording_without_upload_row_does_not_create_one(load_handler, monkeypatch):
+    module, s3, updates, jobs = transcription_handler(load_handler, monkeypatch, {'recordings/abc.m4a': m4a_bytes()})
+
+    def update_item(**kwargs):
+        raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'failed'}}, 'UpdateItem')
+    monkeypatch.setattr(module, 'dynamodb_client', SimpleNamespace(update_item=update_item))
+
+    assert module.lambda_handler(s3_event('recordings/abc.m4a'), None)['statusCode'] == 200
+    assert len(jobs) == 1
+
+
+def test_mislabelled_recording_rejected_without_job(load_handler, monkeypatch):
+    module, s3, updates, jobs = transcription_handler(load_handler, monkeypatch, {'recordings/abc.mp3': m4a_bytes()})
+
+    response = module.lambda_handler(s3_event('recordings/abc.mp3'), None)
+
+    assert response['statusCode'] == 400
+    assert jobs == []
+    assert s3.deleted == ['recordings/abc.mp3']
+    assert updates[0]['ExpressionAttributeValues'][':s'] == {'S': 'rejected'}
+
+
+def test_too_long_recording_rejected(load_handler, monkeypatch):
+    module, s3, updates, jobs = transcription_handler(
+        load_handler, monkeypatch, {'recordings/abc.m4a': m4a_bytes(duration_seconds=5 * 60 * 60)})
+
+    assert module.lambda_handler(s3_event('recordings/abc.m4a'), None)['statusCode'] == 400
+    assert jobs == []
+
+
+def test_pre_signed_post_has_size_and_type_conditions(load_handler, monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    module = load_handler('pre_signed_url', {
+        'APPLICATION_BUCKET': 'bucket', 'SOURCE_PREFIX': 'recordings', 'DYNAMODB_TABLE_NAME': 'uploads', 'SES_SEND_EMAIL': 'false'})
+    rows = []
+    monkeypatch.setattr(module, 'dynamodb', SimpleNamespace(put_item=lambda **kwargs: rows.append(kwargs['Item'])))
+
+    event = {
+        'queryStringParameters': {'file': 'meeting.m4a'},
+        'requestContext': {'authorizer': {'claims': {'cognito:username': 'user', 'email': 'user@example.com'}}},
+    }
+    body = json.loads(module.lambda_handler(event, None)['body'])
+
+    assert body['fields']['Content-Type'] == 'audio/mp4'
+    policy = json.loads(base64.b64decode(body['fields']['policy']))
+    assert ['content-length-range', module.MIN_UPLOAD_BYTES, module.MAX_UPLOAD_BYTES] in policy['conditions']
+    assert {'Content-Type': 'audio/mp4'} in policy['conditions']
+    assert rows[0]['upload_status'] == {'S': 'pending'}
+    assert 'expires_at' in rows[0]
+
+
+def test_upload_rows_listed_with_numeric_attributes(load_handler, monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    pre_signed = load_handler('pre_signed_url', {
+        'APPLICATION_BUCKET': 'bucket', 'SOURCE_PREFIX': 'recordings', 'DYNAMODB_TABLE_NAME': 'uploads', 'SES_SEND_EMAIL': 'false'})
+    rows = []
+    monkeypatch.setattr(pre_signed, 'dynamodb', SimpleNamespace(put_item=lambda **kwargs: rows.append(kwargs['Item'])))
+    claims = {'requestContext': {'authorizer': {'claims': {'cognito:username': 'user', 'email': 'user@example.com'}}}}
+    pre_signed.lambda_handler(dict(claims, queryStringParameters={'file': 'meeting.m4a'}), None)
+    #the row once the recording is accepted
+    accepted = dict(rows[0], file_name={'S': 'accepted'}, upload_status={'S': 'uploaded'}, duration_seconds={'N': '90'})
+    del accepted['expires_at']
+
+    deserializer = TypeDeserializer()
+    items = [{key: deserializer.deserialize(value) for key, value in row.items()} for row in (rows[0], accepted)]
+    list_uploads = load_handler('list_uploads', {'DYNAMODB_TABLE_NAME': 'uploads'})
+    monkeypatch.setattr(list_uploads, 'table', SimpleNamespace(scan=lambda **kwargs: {'Items': items}))
+
+    listed = json.loads(list_uploads.lambda_handler(claims, None)['body'])
+
+    assert listed[0]['expires_at'] == int(rows[0]['expires_at']['N'])
+    assert listed[1]['duration_seconds'] == 90
@@ -51,13 +51,13 @@ function App() {
     const url_generate_pre_signed = url+"/pre_signed_url?file="+selectedFile.name+"&name="+event.target.user.value
     axios.get(url_generate_pre_signed, { headers: { Authorization: auth_string } })
     .then(function (result) {
-      var signedUrl = result.data.pre_signed_url;
-      var options = {
-        headers: {
-          'Content-Type': selectedFile.type,
-        }
-      };
-      return axios.put(signedUrl, selectedFile, options);
+      //pre signed POST - the returned fields (including the content type) must be sent before the file
+      var formData = new FormData();
+      Object.entries(result.data.fields).forEach(([field, value]) => {
+        formData.append(field, value);
+      });
+      formData.append('file', selectedFile);
+      return axios.post(result.data.pre_signed_url, formData);
     })
     .then(function (result) {
       alert("File upload success - you will receive an email shortly");